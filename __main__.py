@@ -12,7 +12,11 @@
 # GNU General Public License for more details.
 #
 # You should have received a copy of the GNU General Public License
+import multiprocessing
+
 import flopferret
 
 if __name__ == "__main__":
+    # The process pool's workers need this in a frozen app.
+    multiprocessing.freeze_support()
     flopferret.main()
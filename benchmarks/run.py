@@ -0,0 +1,356 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Benchmarks for the analysis engine and the GUI hot paths.
+
+usage: python benchmarks/run.py [-o results.json] [-k filter]
+       python benchmarks/run.py --compare old.json new.json
+
+Runs headless: Qt uses the offscreen platform and saved ranges are read from
+an empty temporary data directory. Results are written as JSON, with times in
+seconds per call, so runs from different commits can be compared.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# These must be set before Qt or xdg are imported.
+os.environ["QT_QPA_PLATFORM"] = "offscreen"
+os.environ["XDG_DATA_HOME"] = tempfile.mkdtemp(prefix="flopferret-bench-")
+sys.path.insert(0, ROOT)
+
+import eval7  # noqa: E402
+
+from flopferret import board_texture  # noqa: E402
+from flopferret import equity  # noqa: E402
+from flopferret import hand_range  # noqa: E402
+
+NARROW = "QQ+, AKs, AKo"
+WIDE = "22+, A2s+, K2s+, Q2s+, J6s+, T6s+, 96s+, 86s+, 75s+, 64s+, 54s, " \
+    "A2o+, K8o+, Q9o+, J9o+, T9o"
+SINGLES = ", ".join("{}{}{}{}".format(r1, s1, r2, s2)
+                    for r1, r2 in ("AK", "QJ", "T9", "87")
+                    for s1 in "cdhs" for s2 in "cdhs" if s1 != s2)
+BOARDS = {
+    "flop": ["Ah", "Kd", "7c"],
+    "turn": ["Ah", "Kd", "7c", "2h"],
+    "river": ["Ah", "Kd", "7c", "2h", "9s"],
+}
+
+benchmarks = []
+
+
+def benchmark(name):
+    """Register a benchmark. The decorated function does any setup and
+    returns the function to time."""
+    def decorator(setup):
+        benchmarks.append((name, setup))
+        return setup
+    return decorator
+
+
+def clear_caches():
+    hand_range.clear_caches()
+    board_texture.clear_caches()
+
+
+@benchmark("hand_range.construct.narrow.cold")
+def _():
+    def run():
+        hand_range.clear_caches()
+        hand_range.HandRange(NARROW)
+    return run
+
+
+@benchmark("hand_range.construct.wide.cold")
+def _():
+    def run():
+        hand_range.clear_caches()
+        hand_range.HandRange(WIDE)
+    return run
+
+
+@benchmark("hand_range.construct.wide.warm")
+def _():
+    return lambda: hand_range.HandRange(WIDE)
+
+
+@benchmark("hand_range.exclude_cards")
+def _():
+    hr = hand_range.HandRange(WIDE)
+    board = [eval7.Card(c) for c in BOARDS["flop"]]
+    return lambda: hr.copy().exclude_cards(board)
+
+
+def _calculate_benchmarks():
+    for street, board in BOARDS.items():
+        for range_name, range_string in (("narrow", NARROW), ("wide", WIDE)):
+            name = "board_texture.calculate.{}.{}".format(street, range_name)
+
+            def cold(range_string=range_string, board=board):
+                def run():
+                    clear_caches()
+                    board_texture.BoardTexture().calculate(range_string, board)
+                return run
+
+            def board_cached(range_string=range_string, board=board):
+                # A range edit on a board which has already been classified.
+                board_texture.BoardTexture().calculate(range_string, board)
+
+                def run():
+                    board_texture._cached_totals.cache_clear()
+                    board_texture.BoardTexture().calculate(range_string, board)
+                return run
+
+            def warm(range_string=range_string, board=board):
+                board_texture.BoardTexture().calculate(range_string, board)
+                return lambda: board_texture.BoardTexture().calculate(
+                    range_string, board)
+
+            benchmark(name + ".cold")(cold)
+            benchmark(name + ".board_cached")(board_cached)
+            benchmark(name + ".warm")(warm)
+
+
+_calculate_benchmarks()
+
+
+@benchmark("board_texture.classify_combos.flop")
+def _():
+    board = [eval7.Card(c) for c in BOARDS["flop"]]
+    return lambda: board_texture.classify_combos(board)
+
+
+def _turn_boards():
+    flop = [eval7.Card(c) for c in BOARDS["flop"]]
+    return [flop + [card] for card in hand_range.cards if card not in flop]
+
+
+@benchmark("board_texture.texture_over_boards.turns")
+def _():
+    weights = hand_range.compile_range(WIDE)
+    boards = _turn_boards()
+    return lambda: board_texture.texture_over_boards(
+        weights, boards, serial=True)
+
+
+@benchmark("board_texture.texture_totals.turns.loop")
+def _():
+    weights = hand_range.compile_range(WIDE)
+    boards = _turn_boards()
+
+    def run():
+        clear_caches()
+        for board in boards:
+            board_texture.texture_totals(weights, board)
+    return run
+
+
+@benchmark("board_texture.check_flush_draw")
+def _():
+    cards = [eval7.Card(c) for c in ("Ah", "Kh", "7c", "2h", "9h")]
+    return lambda: board_texture.BoardTexture.check_flush_draw(cards)
+
+
+@benchmark("board_texture.check_straight_draw")
+def _():
+    cards = [eval7.Card(c) for c in ("9h", "8d", "7c", "2h", "5s")]
+    return lambda: board_texture.BoardTexture.check_straight_draw(cards)
+
+
+@benchmark("board_texture.pair_type")
+def _():
+    hand = [eval7.Card(c) for c in ("Kh", "Qc")]
+    board = [eval7.Card(c) for c in ("Ah", "Kd", "7c")]
+    return lambda: board_texture.BoardTexture.pair_type(hand, board)
+
+
+@benchmark("equity.flop.wide_vs_narrow")
+def _():
+    hero = hand_range.compile_range(WIDE)
+    villain = hand_range.compile_range(NARROW)
+    board = [eval7.Card(c) for c in BOARDS["flop"]]
+    return lambda: equity.equity(hero, villain, board)
+
+
+@benchmark("equity.turn.wide_vs_wide")
+def _():
+    weights = hand_range.compile_range(WIDE)
+    board = [eval7.Card(c) for c in BOARDS["turn"]]
+    return lambda: equity.equity(weights, weights, board)
+
+
+_app = None
+
+
+def qt_app():
+    global _app
+    from PyQt5 import QtWidgets
+    if _app is None:
+        _app = QtWidgets.QApplication.instance() or \
+            QtWidgets.QApplication([sys.argv[0]])
+    return _app
+
+
+@benchmark("gui.range_validator.validate.cold")
+def _():
+    qt_app()
+    from flopferret import validators
+    validator = validators.RangeValidator()
+    validator.saved_ranges = {}
+
+    def run():
+        hand_range.clear_caches()
+        validators._expand_range_string.cache_clear()
+        validator.validate(WIDE.lower(), 0)
+    return run
+
+
+@benchmark("gui.range_validator.validate.warm")
+def _():
+    qt_app()
+    from flopferret import validators
+    validator = validators.RangeValidator()
+    validator.saved_ranges = {}
+    return lambda: validator.validate(WIDE.lower(), 0)
+
+
+@benchmark("gui.board_validator.validate")
+def _():
+    qt_app()
+    from flopferret import validators
+    validator = validators.BoardValidator()
+    return lambda: validator.validate("ahkd7c2h", 8)
+
+
+def _range_selector():
+    qt_app()
+    from flopferret import range_selector
+    selector = range_selector.RangeSelector(None)
+    selector.set_from_range_string(WIDE + ", " + SINGLES)
+    return selector
+
+
+@benchmark("gui.range_selector.purge_duplicate_singles")
+def _():
+    selector = _range_selector()
+    return selector.purge_duplicate_singles
+
+
+@benchmark("gui.range_selector.range_string")
+def _():
+    selector = _range_selector()
+    return selector.range_string
+
+
+def measure(function, repeat, min_time):
+    """Time `function`, returning per call times for `repeat` runs of enough
+    calls to take at least `min_time` seconds."""
+    function()  # Warm up.
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    times = [elapsed/number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start)/number)
+    return number, times
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL, universal_newlines=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    results = {}
+    for name, setup in benchmarks:
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        number, times = measure(setup(), args.repeat, args.min_time)
+        results[name] = {
+            "number": number,
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.mean(times),
+        }
+        print("{:<58}{:>12.1f} us".format(name, min(times)*1e6))
+        sys.stdout.flush()
+    data = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "eval7": getattr(eval7, "__version__", None),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def compare(old_filename, new_filename):
+    with open(old_filename) as f:
+        old = json.load(f)["results"]
+    with open(new_filename) as f:
+        new = json.load(f)["results"]
+    for name in sorted(set(old) & set(new)):
+        ratio = new[name]["min"]/old[name]["min"]
+        print("{:<58}{:>12.1f} us{:>8.2f}x".format(
+            name, new[name]["min"]*1e6, ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", default="bench_results.json",
+                        help="JSON results file (default: %(default)s)")
+    parser.add_argument("-k", "--filter", action="append",
+                        help="only run benchmarks containing this string")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="minimum seconds per repeat")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two results files instead of running")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,11 +14,14 @@
 # You should have received a copy of the GNU General Public License
 import sys
 
-from PyQt5 import QtWidgets
-
-from . import main_window
 
 def main():
+    # Qt is only imported for the GUI, so the engine and the command line
+    # interface can be used without it.
+    from PyQt5 import QtWidgets
+
+    from . import main_window
+
     app = QtWidgets.QApplication(sys.argv)
     wid = main_window.MainWindow()
 
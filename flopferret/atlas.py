@@ -0,0 +1,206 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Flop atlases: the board texture of a range on every flop.
+
+An atlas covers either all 22,100 flops or the 1,755 suit isomorphic flop
+classes, each weighted by the number of flops it stands for. Rows are
+streamed to a CSV or JSONL file as they are calculated, so an interrupted
+run can be resumed, and can be aggregated by board class afterwards.
+"""
+
+import collections
+import csv
+import functools
+import itertools
+import json
+import os
+
+import eval7
+
+from . import board_texture
+from . import hand_range
+from . import isomorphism
+from . import parallel
+
+top_pair_or_better = board_texture.hand_types[2:] + ["Over Pair", "Top Pair"]
+derived = ["Top Pair+"]
+columns = ["board", "weight", "class"] + board_texture.categories + derived
+formats = ["csv", "jsonl"]
+
+_suit_patterns = {1: "monotone", 2: "two-tone", 3: "rainbow"}
+_pairings = {1: "trips", 2: "paired", 3: "unpaired"}
+
+
+@functools.lru_cache(maxsize=2)
+def flops(canonical=True):
+    """Return a list of (board key, weight) pairs covering every flop.
+
+    If `canonical` there is one entry for each suit isomorphism class,
+    weighted by the number of flops in the class. Otherwise every flop has
+    weight one, with isomorphic flops next to each other.
+    """
+    keys = list(itertools.combinations(range(52), 3))
+    canonical_keys = {
+        key: isomorphism.canonical_board([hand_range.cards[i] for i in key])[0]
+        for key in keys
+    }
+    if canonical:
+        counts = collections.Counter(canonical_keys.values())
+        return sorted(counts.items())
+    return [(key, 1) for key in sorted(keys, key=canonical_keys.get)]
+
+
+def board_string(key):
+    """Return the board string for a board key, highest card first."""
+    return ''.join(str(hand_range.cards[i]) for i in reversed(key))
+
+
+def board_class(key):
+    """Describe the texture class of a flop, e.g. "A-high two-tone paired"."""
+    cards = [hand_range.cards[i] for i in key]
+    high_rank = max(card.rank for card in cards)
+    return "{}-high {} {}".format(
+        eval7.rangestring.ranks[high_rank],
+        _suit_patterns[len(set(card.suit for card in cards))],
+        _pairings[len(set(card.rank for card in cards))],
+    )
+
+
+def make_row(key, weight, totals):
+    """Return an atlas row for a board."""
+    row = {"board": board_string(key), "weight": weight,
+           "class": board_class(key)}
+    row.update(zip(board_texture.categories, totals))
+    row["Top Pair+"] = sum(row[name] for name in top_pair_or_better)
+    return row
+
+
+def _texture_chunk(keys, weights):
+    # Calculate the category totals for a chunk of boards.
+    boards = [[hand_range.cards[i] for i in key] for key in keys]
+    return board_texture.texture_over_boards(
+        weights, boards, serial=True).tolist()
+
+
+def guess_format(filename):
+    return "jsonl" if filename.endswith(".jsonl") else "csv"
+
+
+def run(weights, filename, file_format=None, canonical=True, resume=False,
+        progress=None):
+    """Write the atlas of combo `weights` to `filename`.
+
+    Ranges which aren't suit symmetric always get every flop, since
+    isomorphic flops aren't equivalent for them.
+    With `resume`, boards already in the file are skipped and new rows are
+    appended. `progress`, if given, is called with the number of boards done
+    and the total after each chunk. Return the number of boards calculated.
+    """
+    file_format = file_format or guess_format(filename)
+    boards = flops(canonical and isomorphism.is_suit_symmetric(weights))
+    done = set()
+    if resume and os.path.exists(filename):
+        _remove_partial_line(filename)
+        done = {row["board"] for row in read(filename, file_format)}
+    board_weights = {key: weight for key, weight in boards
+                     if board_string(key) not in done}
+    count = len(done)
+    with open(filename, "a" if resume else "w", newline="") as f:
+        if file_format == "csv":
+            writer = csv.DictWriter(f, columns)
+            if f.tell() == 0:
+                writer.writeheader()
+            write_row = writer.writerow
+        else:
+            def write_row(row):
+                f.write(json.dumps(row) + "\n")
+        for keys, results in parallel.imap_chunks(
+                _texture_chunk, list(board_weights), weights):
+            for key, totals in zip(keys, results):
+                write_row(make_row(key, board_weights[key], totals))
+            f.flush()
+            count += len(keys)
+            if progress is not None:
+                progress(count, len(boards))
+    return len(board_weights)
+
+
+def _remove_partial_line(filename):
+    # Drop a final line left incomplete by an interrupted run.
+    with open(filename, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def read(filename, file_format=None):
+    """Yield the rows of an atlas file."""
+    file_format = file_format or guess_format(filename)
+    with open(filename, newline="") as f:
+        if file_format == "csv":
+            for row in csv.DictReader(f):
+                row["weight"] = int(row["weight"])
+                for name in board_texture.categories + derived:
+                    row[name] = float(row[name])
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def aggregate(rows):
+    """Return weighted averages of the atlas rows for each board class.
+
+    The result maps class names (and "All") to dicts with the number of
+    boards, their total weight, and the average of each category.
+    """
+    names = board_texture.categories + derived
+    totals = collections.defaultdict(collections.Counter)
+    for row in rows:
+        for board_class_name in (row["class"], "All"):
+            total = totals[board_class_name]
+            total["boards"] += 1
+            total["weight"] += row["weight"]
+            for name in names:
+                total[name] += row["weight"]*row[name]
+    summary = {}
+    for board_class_name, total in totals.items():
+        summary[board_class_name] = {"boards": total["boards"],
+                                     "weight": total["weight"]}
+        for name in names:
+            summary[board_class_name][name] = total[name]/total["weight"]
+    return summary
+
+
+def write_summary(summary, filename):
+    """Write an aggregate summary to a CSV file, one row per class."""
+    names = board_texture.categories + derived
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, ["class", "boards", "weight"] + names)
+        writer.writeheader()
+        for board_class_name in sorted(summary, key=_class_sort_key):
+            row = {"class": board_class_name}
+            row.update(summary[board_class_name])
+            writer.writerow(row)
+
+
+def _class_sort_key(board_class_name):
+    # Sort classes by high card (highest first), with "All" at the end.
+    if board_class_name == "All":
+        return (1, 0, "")
+    rank = eval7.rangestring.ranks.index(board_class_name[0])
+    return (0, -rank, board_class_name)
@@ -13,9 +13,17 @@
 #
 # You should have received a copy of the GNU General Public License
 
+import functools
+import itertools
+
 import eval7
+import numpy
 
 from . import hand_range
+from . import isomorphism
+from . import lookup_tables
+from . import parallel
+from . import profiling
 
 hand_types = [
     "High Card",
@@ -30,86 +38,565 @@ hand_types = [
 ]
 draw_types = ["Flush Draw", "OESD", "Gutshot"]
 pair_types = ["Over Pair", "Top Pair", "Second Pair", "Low Pair", "Board Pair"]
+# Flush draws which are also straight draws, backdoor draws (counted on the
+# flop only) and unpaired hands with cards above the board.
+extra_draw_types = [
+    "Combo Draw",
+    "Backdoor Flush Draw",
+    "Backdoor Straight Draw",
+    "Overcards",
+    "Two Overcards"
+]
+# Flushes and straights which no other hand beats, or only one does.
+nut_types = [
+    "Nut Flush",
+    "Second Nut Flush",
+    "Nut Straight",
+    "Second Nut Straight"
+]
+
+
+categories = hand_types + draw_types + pair_types + extra_draw_types + \
+    nut_types
+category_index = {name: i for i, name in enumerate(categories)}
+# Categories grouped for display.
+sections = [
+    ("Hand Type Breakdown", hand_types),
+    ("Pair Breakdown", pair_types),
+    ("Draw Breakdown", draw_types),
+    ("More Draws", extra_draw_types),
+    ("Nut Breakdown", nut_types),
+]
+
+
+_pair_index = category_index["Pair"]
+_straight_index = category_index["Straight"]
+_flush_index = category_index["Flush"]
+_flush_draw_index = category_index["Flush Draw"]
+_combo_draw_index = category_index["Combo Draw"]
+_backdoor_flush_index = category_index["Backdoor Flush Draw"]
+_backdoor_straight_index = category_index["Backdoor Straight Draw"]
+_overcards_index = category_index["Overcards"]
+_two_overcards_index = category_index["Two Overcards"]
+_nut_flush_index = category_index["Nut Flush"]
+_second_nut_flush_index = category_index["Second Nut Flush"]
+_nut_straight_index = category_index["Nut Straight"]
+_second_nut_straight_index = category_index["Second Nut Straight"]
+_straight_draw_indices = [
+    None if name is None else category_index[name]
+    for name in lookup_tables.straight_draw_names
+]
+
+
+def parse_board(board_string):
+    """Split a board string such as "Ah Kd 7c" or "ahkd7c" into a list of
+    card strings."""
+    stripped = board_string.replace(" ", "")
+    card_strings = [stripped[i:i+2].capitalize()
+                    for i in range(0, len(stripped), 2)]
+    for card_string in card_strings:
+        if len(card_string) != 2 or \
+                card_string[0] not in eval7.rangestring.ranks or \
+                card_string[1] not in eval7.rangestring.suits:
+            raise ValueError("Invalid card: '{}'".format(card_string))
+    if len(set(card_strings)) < len(card_strings):
+        raise ValueError("Duplicate cards in board!")
+    if not 3 <= len(card_strings) <= 5:
+        raise ValueError("A board must have 3 to 5 cards!")
+    return card_strings
+
+
+def board_key(board):
+    """Return a hashable key for a list of board cards, ignoring order."""
+    return tuple(sorted(hand_range.card_index[card] for card in board))
+
+
+@functools.lru_cache(maxsize=128)
+def _cached_classification(key):
+    table = classify_combos([hand_range.cards[i] for i in key])
+    table.setflags(write=False)
+    return table
+
+
+def classification_table(board):
+    """Return the combo classification table for `board`.
+
+    Tables are cached for canonical boards, so every suit isomorphic board
+    shares one cache entry.
+    """
+    key, permutation = isomorphism.canonical_board(board)
+    table = _cached_classification(key)
+    return table[isomorphism.combo_permutations[permutation]]
+
+
+def texture_totals(weights, board, by_river=False):
+    """Return the category totals for the combo `weights` on `board`.
+
+    The weights are normalized after removing the board cards. Results are
+    cached, and suit symmetric ranges share entries across suit isomorphic
+    boards.
+    """
+    if isomorphism.is_suit_symmetric(weights):
+        key = isomorphism.canonical_board(board)[0]
+    else:
+        key = board_key(board)
+    weights = numpy.asarray(weights, dtype=float)
+    return numpy.array(_cached_totals(weights.tobytes(), key, by_river))
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_totals(weights_bytes, key, by_river):
+    board = [hand_range.cards[i] for i in key]
+    with profiling.stage("card exclusion"):
+        weights = numpy.frombuffer(weights_bytes).copy()
+        weights[hand_range.card_mask(board)] = 0.0
+        total = weights.sum()
+        if not total == 0.0:
+            weights /= total
+    if by_river and len(board) < 5:
+        totals = by_river_totals(weights, board)
+    else:
+        totals = weights.dot(classification_table(board))
+    return tuple(totals.tolist())
+
+
+def texture_matrix(weights, board):
+    """Return the category totals for each row of a (ranges x combos) weight
+    matrix on `board`.
+
+    Every range is normalized after removing the board cards, and all of them
+    are scored by one product with the board's classification table.
+    """
+    weights = numpy.array(weights, dtype=float, ndmin=2)
+    weights[:, hand_range.card_mask(board)] = 0.0
+    totals = weights.sum(axis=1, keepdims=True)
+    totals[totals == 0.0] = 1.0
+    return (weights/totals).dot(classification_table(board))
+
+
+def calculate_ranges(hand_range_strings, board_card_strings,
+                     saved_ranges=None):
+    """Return a list of BoardTextures, one for each range on the board."""
+    board = list(map(eval7.Card, board_card_strings))
+    if len(board) < 3:
+        raise ValueError("Not enough cards in board!")
+    weights = [hand_range.compile_range(s, saved_ranges)
+               for s in hand_range_strings]
+    if not weights:
+        return []
+    textures = []
+    for totals in texture_matrix(weights, board).tolist():
+        texture = BoardTexture()
+        texture.update(zip(categories, totals))
+        textures.append(texture)
+    return textures
+
+
+profiling.register_cache("classification tables", _cached_classification)
+profiling.register_cache("texture results", _cached_totals)
+
+
+def clear_caches():
+    """Empty the classification and result caches."""
+    _cached_classification.cache_clear()
+    _cached_totals.cache_clear()
+
+
+def classify_combos(board, indices=None):
+    """Classify every combo on `board`.
+
+    Return a (combos x categories) array with a one for each category a combo
+    falls in. Rows for combos which conflict with the board are all zero. If
+    `indices` is given only those combos are classified, and the table has
+    one row for each of them.
+    """
+    if indices is None:
+        indices = numpy.arange(len(hand_range.combos))
+    table = numpy.zeros((len(indices), len(categories)))
+    live = numpy.flatnonzero(~hand_range.card_mask(board)[indices])
+    hands = [list(hand_range.combos[i]) for i in indices[live]]
+    with profiling.stage("evaluate", len(hands)):
+        values = numpy.array([eval7.evaluate(board + hand) for hand in hands],
+                             dtype=numpy.int64)
+    board_masks = numpy.array(
+        [lookup_tables.suit_rank_mask(board)], dtype=numpy.int64)
+    deals, columns = classify_deals(
+        values, numpy.zeros(len(live), dtype=int), board_masks,
+        hand_range.combo_cards[indices[live]]
+    )
+    table[live[deals], columns] = 1.0
+    return table
+
+
+# Runouts classified together by `by_river_totals` and `next_card_totals`.
+_runout_batch_size = 64
+
+
+def by_river_totals(weights, board):
+    """Return the category totals for combo `weights` by the river.
+
+    Every turn and river runout of `board` is enumerated for each combo, with
+    the runouts spread over the shared process pool.
+    """
+    board_indices = [hand_range.card_index[card] for card in board]
+    remaining = [i for i in range(52) if i not in board_indices]
+    runouts = list(itertools.combinations(remaining, 5 - len(board)))
+    indices = numpy.flatnonzero(weights)
+    with profiling.stage("runout enumeration", len(runouts)):
+        results = parallel.map_chunks(
+            _runout_totals, runouts, board_indices, indices,
+            weights[indices], serial=len(indices) == 0
+        )
+    # Each combo is blocked from the runouts using its cards, but every combo
+    # has the same number of runouts left.
+    runouts_per_combo = len(list(itertools.combinations(
+        range(len(remaining) - 2), 5 - len(board)
+    )))
+    return sum(results) / runouts_per_combo
+
+
+def _runout_totals(runouts, board_indices, indices, weights):
+    # Sum the classification of the weighted combos over `runouts`.
+    totals = numpy.zeros(len(categories))
+    for r, h, deals, columns in _runout_deals(runouts, board_indices, indices):
+        totals += numpy.bincount(
+            columns, weights[h][deals], minlength=len(categories))
+    return totals
+
+
+def _runout_deals(runouts, board_indices, indices):
+    # Classify the combos `indices` on each of `runouts` of the board,
+    # a batch of runouts at a time with array operations. Yield (r, h, deals,
+    # columns) for each batch, where r and h are the runout and combo of each
+    # live (runout, combo) pair, as indices into `runouts` and `indices`, and
+    # deals and columns are as from classify_deals.
+    board = [hand_range.cards[i] for i in board_indices]
+    board_mask = lookup_tables.suit_rank_mask(board)
+    hands = [list(hand_range.combos[i]) for i in indices]
+    combo_cards = hand_range.combo_cards[indices]
+    for start in range(0, len(runouts), _runout_batch_size):
+        batch = numpy.array(runouts[start:start + _runout_batch_size])
+        dead = numpy.zeros((len(batch), 52), dtype=bool)
+        dead[numpy.arange(len(batch))[:, None], batch] = True
+        live = ~(dead[:, combo_cards[:, 0]] | dead[:, combo_cards[:, 1]])
+        r, h = numpy.nonzero(live)
+        boards = [board + [hand_range.cards[i] for i in runout]
+                  for runout in batch.tolist()]
+        with profiling.stage("evaluate", len(r)):
+            values = numpy.array([
+                eval7.evaluate(boards[i] + hands[j])
+                for i, j in zip(r.tolist(), h.tolist())
+            ], dtype=numpy.int64)
+        board_masks = board_mask | numpy.bitwise_or.reduce(
+            _card_masks[batch], axis=1)
+        deals, columns = classify_deals(
+            values, r, board_masks, combo_cards[h])
+        yield r + start, h, deals, columns
+
+
+def next_card_totals(weights, board, cards):
+    """Return a (cards x categories) array of the category totals for the
+    combo `weights` on `board` plus each of `cards`.
+
+    Each row is the same as `texture_totals(weights, board + [card])`. The
+    cards are classified as one card runouts of `board`, like
+    `by_river_totals`, so the board and the range's live combos are only
+    worked out once.
+    """
+    weights = numpy.array(weights, dtype=float)
+    weights[hand_range.card_mask(board)] = 0.0
+    board_indices = [hand_range.card_index[card] for card in board]
+    runouts = [(hand_range.card_index[card], ) for card in cards]
+    indices = numpy.flatnonzero(weights)
+    weights = weights[indices]
+    size = len(categories)
+    totals = numpy.zeros(len(runouts)*size)
+    live_totals = numpy.zeros(len(runouts))
+    for r, h, deals, columns in _runout_deals(runouts, board_indices, indices):
+        totals += numpy.bincount(r[deals]*size + columns, weights[h][deals],
+                                 minlength=len(totals))
+        live_totals += numpy.bincount(r, weights[h], minlength=len(runouts))
+    live_totals[live_totals == 0.0] = 1.0
+    return totals.reshape(len(runouts), size) / live_totals[:, None]
+
+
+# Array versions of the lookup tables and per card and combo attributes for
+# classifying many boards at once. Every value fits in 16 bits, and the
+# smaller type makes the array operations over every deal quicker.
+def _small_array(values):
+    return numpy.array(values, dtype=numpy.int16)
+
+
+_straight_draw_array = _small_array(lookup_tables.straight_draws)
+_max_suit_count_array = _small_array(lookup_tables.max_suit_counts)
+_high_rank_array = _small_array(lookup_tables.high_ranks)
+_second_rank_array = _small_array(lookup_tables.second_ranks)
+_bit_count_array = _small_array(lookup_tables.bit_counts)
+_ranks_above_array = _small_array(lookup_tables.ranks_above)
+_straight_window_array = _small_array(lookup_tables.straight_windows)
+_straight_high_array = _small_array(lookup_tables.straight_highs)
+_nut_straight_array = _small_array(lookup_tables.nut_straights)
+_second_nut_straight_array = _small_array(
+    lookup_tables.second_nut_straights)
+_flush_suit_array = _small_array(lookup_tables.flush_suits)
+_suit_shift_array = _small_array(lookup_tables.suit_shifts)
+_hand_type_columns = _small_array(
+    [category_index[eval7.handtype(t << 24)] for t in range(9)])
+_straight_draw_columns = _small_array(
+    [-1 if i is None else i for i in _straight_draw_indices])
+_pair_columns = _small_array([category_index[name] for name in pair_types])
+_card_ranks = _small_array([card.rank for card in hand_range.cards])
+_card_suits = _small_array([card.suit for card in hand_range.cards])
+_card_suit_keys = _small_array(
+    [lookup_tables.suit_shifts[card.suit] for card in hand_range.cards])
+_card_masks = numpy.array(
+    [lookup_tables.suit_rank_mask([card]) for card in hand_range.cards],
+    dtype=numpy.int64)
+
+
+def texture_over_boards(weights, boards, serial=False):
+    """Return a (boards x categories) array of the category totals for the
+    combo `weights` on each of `boards`.
+
+    Each row is the same as `texture_totals(weights, board)`. The combos are
+    classified for all of the boards together with array operations, so
+    evaluating the hands is the only per combo work, and suit symmetric
+    ranges are only evaluated once per isomorphism class. Boards are spread
+    over the shared process pool unless `serial` is true.
+    """
+    weights = numpy.asarray(weights, dtype=float)
+    if isomorphism.is_suit_symmetric(weights):
+        # Suit isomorphic boards have the same totals.
+        keys = [isomorphism.canonical_board(board)[0] for board in boards]
+    else:
+        keys = [board_key(board) for board in boards]
+    if not keys:
+        return numpy.zeros((0, len(categories)))
+    unique_keys = sorted(set(keys))
+    indices = numpy.flatnonzero(weights)
+    with profiling.stage("board enumeration", len(unique_keys)):
+        results = parallel.map_chunks(
+            _boards_totals, unique_keys, indices, weights[indices],
+            serial=serial or len(indices) == 0
+        )
+    rows = {key: i for i, key in enumerate(unique_keys)}
+    return numpy.concatenate(results)[[rows[key] for key in keys]]
+
+
+def _boards_totals(keys, indices, weights):
+    # Return the category totals of the weighted combos on each board.
+    boards = [[hand_range.cards[i] for i in key] for key in keys]
+    hands = [list(hand_range.combos[i]) for i in indices]
+    combo_cards = hand_range.combo_cards[indices]
+    board_cards = numpy.zeros((len(keys), 52), dtype=bool)
+    for b, key in enumerate(keys):
+        board_cards[b, list(key)] = True
+    live = ~(board_cards[:, combo_cards[:, 0]] |
+             board_cards[:, combo_cards[:, 1]])
+    # One entry for each live (board, combo) pair, board by board.
+    b, h = numpy.nonzero(live)
+    with profiling.stage("evaluate", len(b)):
+        values = numpy.array([
+            eval7.evaluate(boards[i] + hands[j])
+            for i, j in zip(b.tolist(), h.tolist())
+        ], dtype=numpy.int64)
+    with profiling.stage("batch classification", len(b)):
+        board_masks = numpy.array(
+            [lookup_tables.suit_rank_mask(board) for board in boards],
+            dtype=numpy.int64)
+        deals, columns = classify_deals(
+            values, b, board_masks, combo_cards[h])
+        totals = (live*weights).sum(axis=1)
+        totals[totals == 0.0] = 1.0
+        result = numpy.bincount(
+            b[deals]*len(categories) + columns, (weights[h]/totals[b])[deals],
+            minlength=len(keys)*len(categories)
+        )
+    return result.reshape(len(keys), len(categories))
+
+
+def classify_deals(values, boards, board_masks, hand_cards):
+    """Classify many hands, each on its own board, with array operations.
+
+    Each deal is given by the eval7 hand value, the index of its board in
+    `board_masks`, which holds each board's cards as a
+    `lookup_tables.suit_rank_mask`, and the card indices of the two hole
+    cards, highest rank first. Return (deals, columns) arrays with an entry
+    for each category a deal falls in.
+    """
+    with profiling.stage("draw detection", len(values)):
+        types = values >> 24
+        first, second = hand_cards[:, 0], hand_cards[:, 1]
+        high = _card_ranks[first]
+        low = _card_ranks[second]
+        # Work out what's needed about each board once, then look it up for
+        # each deal. Draws and overcards only count before the river, and
+        # backdoor draws on the flop.
+        suit_ranks = numpy.stack(
+            [(board_masks >> (13*s)) & 8191 for s in range(4)]
+        ).astype(numpy.int16)
+        ranks_by_board = numpy.bitwise_or.reduce(suit_ranks, axis=0)
+        suit_counts = _bit_count_array[suit_ranks]
+        suits_by_board = _suit_shift_array.dot(suit_counts)
+        size = suit_counts.sum(axis=0)
+        top_by_board = _high_rank_array[ranks_by_board]
+        board_ranks = ranks_by_board[boards]
+        board_suits = suits_by_board[boards]
+        before_river = (size < 5)[boards]
+        # No card is above the top rank on the river.
+        overcard_rank = numpy.where(size < 5, top_by_board, 12)[boards]
+        backdoor_flush_boards = (
+            (size == 3) & (_max_suit_count_array[suits_by_board] < 3)
+        )[boards]
+        # The straights a hand can add a third rank to on the flop.
+        backdoor_straights = numpy.where(
+            size == 3, ~_straight_window_array[ranks_by_board], 0)[boards]
+        deals = [numpy.arange(len(values))]
+        columns = [_hand_type_columns[types]]
+
+        def add(column, hits):
+            deals.append(hits)
+            columns.append(numpy.full(len(hits), column))
+
+        suits = board_suits + _card_suit_keys[first] + _card_suit_keys[second]
+        suit_count = _max_suit_count_array[suits]
+        flush_draws = before_river & (types < _flush_index) & (suit_count == 4)
+        add(_flush_draw_index, numpy.flatnonzero(flush_draws))
+
+        ranks = board_ranks | (1 << high) | (1 << low)
+        straight_draws = numpy.where(
+            before_river & (types < _straight_index),
+            _straight_draw_array[ranks], 0
+        )
+        has_draw = numpy.flatnonzero(straight_draws)
+        deals.append(has_draw)
+        columns.append(_straight_draw_columns[straight_draws[has_draw]])
+
+        add(_combo_draw_index,
+            numpy.flatnonzero(flush_draws & (straight_draws > 0)))
+        add(_backdoor_flush_index,
+            numpy.flatnonzero(backdoor_flush_boards & (suit_count == 3)))
+        add(_backdoor_straight_index, numpy.flatnonzero(
+            (types < _straight_index) & (straight_draws == 0) &
+            (_straight_window_array[ranks] & backdoor_straights > 0)
+        ))
+        no_pair = types == 0
+        add(_overcards_index,
+            numpy.flatnonzero(no_pair & (high > overcard_rank)))
+        add(_two_overcards_index,
+            numpy.flatnonzero(no_pair & (low > overcard_rank)))
+
+    with profiling.stage("pair classification", len(values)):
+        # Break down pairs by type, in the order of pair_types.
+        pairs = numpy.flatnonzero(types == _pair_index)
+        pair_boards = boards[pairs]
+        pair_high, pair_low = high[pairs], low[pairs]
+        pair_ranks = ranks_by_board[pair_boards]
+        pair_rank = numpy.where(
+            (pair_high == pair_low) | ((pair_ranks & (1 << pair_high)) > 0),
+            pair_high,
+            numpy.where((pair_ranks & (1 << pair_low)) > 0, pair_low, -1)
+        )
+        top_rank = top_by_board[pair_boards]
+        pair_type = numpy.select(
+            [pair_rank < 0, pair_rank > top_rank, pair_rank == top_rank,
+             pair_rank >= _second_rank_array[pair_ranks]],
+            [4, 0, 1, 2], 3
+        )
+        deals.append(pairs)
+        columns.append(_pair_columns[pair_type])
+
+        # A flush is the nuts when no unseen card of its suit beats the hand's
+        # best card in the suit, and second best when one does.
+        flushes = numpy.flatnonzero(types == _flush_index)
+        flush_suit = _flush_suit_array[suits[flushes]]
+        hand_rank = numpy.where(
+            _card_suits[first[flushes]] == flush_suit, high[flushes],
+            numpy.where(_card_suits[second[flushes]] == flush_suit,
+                        low[flushes], -1)
+        )
+        better = _bit_count_array[
+            _ranks_above_array[hand_rank + 1] &
+            ~suit_ranks[flush_suit, boards[flushes]]
+        ]
+        add(_nut_flush_index, flushes[better == 0])
+        add(_second_nut_flush_index, flushes[better == 1])
+
+        # A straight is the nuts when no two cards make a higher one.
+        straights = numpy.flatnonzero(types == _straight_index)
+        straight_high = _straight_high_array[ranks[straights]]
+        straight_boards = ranks_by_board[boards[straights]]
+        add(_nut_straight_index, straights[
+            straight_high == _nut_straight_array[straight_boards]])
+        add(_second_nut_straight_index, straights[
+            straight_high == _second_nut_straight_array[straight_boards]])
+    return numpy.concatenate(deals), numpy.concatenate(columns)
 
 
 class BoardTexture(dict):
     def __init__(self):
-        for key in hand_types + draw_types + pair_types:
+        for key in categories:
             self[key] = 0.0
 
-    def calculate(self, hand_range_string, board_card_strings):
-        """Calculate the probabilities of each hand type."""
-        for key in hand_types + draw_types + pair_types:
-            self[key] = 0.0
-        board = list(map(eval7.Card, board_card_strings))
+    def calculate(self, hand_range_string, board_card_strings,
+                  by_river=False):
+        """Calculate the probabilities of each hand type.
+
+        If `by_river` is true, calculate what the range will have at showdown,
+        averaged over every turn and river runout.
+        """
         hr = hand_range.HandRange(hand_range_string)
-        hr.exclude_cards(board)
+        self.calculate_from_range(hr, board_card_strings, by_river)
+
+    def calculate_from_range(self, hr, board_card_strings, by_river=False):
+        """Calculate the probabilities of each hand type for a HandRange.
+
+        The combos are classified once per board, so calculating another
+        range on the same board is just a weighted sum.
+        """
+        board = list(map(eval7.Card, board_card_strings))
         if len(board) < 3:
             raise ValueError("Not enough cards in board!")
-        for hand, prob in hr.items():
-            if not prob == 0.0:
-                cards = board + list(hand)
-                result = eval7.evaluate(cards)
-                hand_type = eval7.handtype(result)
-                self[hand_type] += prob
-                if len(cards) < 7 and hand_types.index(hand_type) < 5:
-                    # No flush or better, so there may be draws.
-                    if self.check_flush_draw(cards):
-                        self["Flush Draw"] += prob
-                    if hand_type != 'Straight':
-                        straight_draw_type = self.check_straight_draw(cards)
-                        if straight_draw_type is not None:
-                            self[straight_draw_type] += prob
-                if hand_type == "Pair":
-                    # Break down pairs by type.
-                    self[self.pair_type(hand, board)] += prob
+        totals = texture_totals(hr.weights, board, by_river)
+        for key, value in zip(categories, totals.tolist()):
+            self[key] = value
 
     @staticmethod
     def check_flush_draw(cards):
         """Determine if `cards` contain a flush draw."""
-        suit_counts = [0, 0, 0, 0]
-        for card in cards:
-            suit_counts[card.suit] += 1
-        return max(suit_counts) == 4
+        suits = lookup_tables.suit_key(cards)
+        return lookup_tables.max_suit_counts[suits] == 4
 
     @staticmethod
     def check_straight_draw(cards):
         """Determine if `cards` contain an OESD or Gutshot."""
-        bits = 0
-        # Build a bitmask for the card ranks.
-        for card in cards:
-            bits |= 2 << card.rank
-            if card.rank == 12:
-                bits |= 1  # Bottom bit represents the low ace.
-
-        # Look for '11110' or '1011101' (Open Ended Straight Draw)
-        for i in range(9):
-            s = bits >> i
-            if s & 31 == 30 or s & 127 == 93:
-                return 'OESD'
-
-        # Look for Gutshot bit patterns
-        for i in range(10):
-            if (bits >> i) & 31 in (30, 29, 27, 23, 15):
-                return 'Gutshot'
-        return None
+        mask = lookup_tables.rank_mask(cards)
+        return lookup_tables.straight_draw_names[
+            lookup_tables.straight_draws[mask]
+        ]
 
     @staticmethod
     def pair_type(hand, board):
         """Determine the kind of pair, assuming one pair hand."""
-        rank_counts = [0]*13
-        board_ranks = sorted(c.rank for c in board)
-        hand_ranks = [c.rank for c in hand]
-        for r in board_ranks + hand_ranks:
-            rank_counts[r] += 1
-        pair_rank = rank_counts.index(2)
-        if pair_rank not in hand_ranks:
-            return "Board Pair"
-        elif pair_rank > board_ranks[-1]:
-            return "Over Pair"
-        elif pair_rank == board_ranks[-1]:
-            return "Top Pair"
-        elif pair_rank >= board_ranks[-2]:
-            return "Second Pair"
-        else:
-            return "Low Pair"
+        high, low = sorted((c.rank for c in hand), reverse=True)
+        return _pair_type(high, low, lookup_tables.rank_mask(board))
+
+
+def _pair_type(high, low, board_ranks):
+    # Determine the kind of pair for a one pair hand with ranks `high` and
+    # `low` on a board with rank mask `board_ranks`.
+    if high == low or board_ranks & lookup_tables.rank_bits[high]:
+        pair_rank = high
+    elif board_ranks & lookup_tables.rank_bits[low]:
+        pair_rank = low
+    else:
+        return "Board Pair"
+    top_rank = lookup_tables.high_ranks[board_ranks]
+    if pair_rank > top_rank:
+        return "Over Pair"
+    elif pair_rank == top_rank:
+        return "Top Pair"
+    elif pair_rank >= lookup_tables.second_ranks[board_ranks]:
+        return "Second Pair"
+    else:
+        return "Low Pair"
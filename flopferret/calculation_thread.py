@@ -0,0 +1,126 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""A worker thread to keep calculations off the GUI thread."""
+
+import html
+import inspect
+import threading
+
+from PyQt5 import QtCore
+
+from . import parallel
+
+
+class CalculationThread(QtCore.QThread):
+    """Run one calculation at a time, always the most recently submitted.
+
+    Submitting a job makes any earlier job stale: if it hasn't started it is
+    dropped, if it is running in the process pool it is cancelled, and its
+    result is never delivered.
+
+    A job which returns a generator is iterated in the thread, with each
+    value it yields delivered by `progress_ready` so partial results can be
+    shown while it runs. The last value is also delivered as the result.
+
+    usage: thread = CalculationThread()
+           thread.result_ready.connect(handle_result)
+           thread.start()
+           thread.submit(function, *args)
+    """
+
+    # job id, result, and the exception raised (or None)
+    result_ready = QtCore.pyqtSignal(int, object, object)
+    # job id and partial result
+    progress_ready = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, parent=None):
+        super(CalculationThread, self).__init__(parent)
+        self._condition = threading.Condition()
+        self._job = None
+        self._job_id = 0
+        self._stopping = False
+
+    def submit(self, function, *args):
+        """Queue `function(*args)`, replacing any earlier job. Return the id
+        the result will be delivered with."""
+        with self._condition:
+            self._job_id += 1
+            self._job = (self._job_id, function, args)
+            self._condition.notify()
+            return self._job_id
+
+    def cancel(self):
+        """Make every submitted job stale."""
+        with self._condition:
+            self._job_id += 1
+            self._job = None
+
+    def is_current(self, job_id):
+        return job_id == self._job_id
+
+    def stop(self):
+        """Cancel everything and wait for the thread to finish."""
+        with self._condition:
+            self._stopping = True
+            self._job_id += 1
+            self._job = None
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._job is None and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                job_id, function, args = self._job
+                self._job = None
+            try:
+                with parallel.cancellation(
+                        lambda: not self.is_current(job_id)):
+                    result = function(*args)
+                    if inspect.isgenerator(result):
+                        result = self._stream(job_id, result)
+                error = None
+            except parallel.Cancelled:
+                continue
+            except Exception as e:
+                result, error = None, e
+            if self.is_current(job_id):
+                self.result_ready.emit(job_id, result, error)
+
+    def _stream(self, job_id, generator):
+        # Deliver each value of a generator as progress, returning the last.
+        result = None
+        try:
+            for result in generator:
+                if not self.is_current(job_id):
+                    raise parallel.Cancelled()
+                self.progress_ready.emit(job_id, result)
+        finally:
+            generator.close()
+        return result
+
+
+def show_error(label, error):
+    """Show the error from a failed job on a status label. Raising it from a
+    result slot instead would abort the process."""
+    message = type(error).__name__
+    if str(error):
+        message += ": " + str(error)
+    label.setText("<i>{}</i>".format(html.escape(message)))
+    label.show()
@@ -0,0 +1,115 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Queries on the per combo classification of a board.
+
+Every combo's categories on a board come from the cached classification
+table, so these are array operations however many combos they cover.
+
+usage: hands(board, ["Flush Draw"], weights)  # ['AhKh', 'QhJh', ...]
+       grid(board, "Top Pair", weights)       # 13x13 array for a heatmap
+       filter_string(board, ["Trips", "Two Pair"], weights)  # "77, AKs"
+       write("combos.csv", board, weights)
+"""
+
+import csv
+
+import numpy
+
+from . import board_texture
+from . import hand_range
+
+formats = ["csv", "npy"]
+
+
+def mask(board, names, weights=None):
+    """Return a mask of the combos in any of the categories `names` on
+    `board`, only counting combos with weight if `weights` is given."""
+    columns = [board_texture.category_index[name] for name in names]
+    result = board_texture.classification_table(board)[:, columns].any(axis=1)
+    if weights is not None:
+        result &= numpy.asarray(weights) > 0
+    return result
+
+
+def hands(board, names, weights=None):
+    """Return the hand strings of the combos `mask` selects."""
+    return [
+        hand_range.hand_strings[i]
+        for i in numpy.flatnonzero(mask(board, names, weights))
+    ]
+
+
+def filter_range(board, names, weights):
+    """Return a copy of the combo `weights` with only the combos in any of
+    the categories `names` on `board` kept."""
+    weights = numpy.array(weights, dtype=float)
+    weights[~mask(board, names)] = 0.0
+    return weights
+
+
+def filter_string(board, names, weights):
+    """Return a range string for `filter_range`.
+
+    Combos blocked by the board are left out of the range either way, so
+    they are free to be written as part of a whole hand class.
+    """
+    return hand_range.range_string(
+        filter_range(board, names, weights), hand_range.card_mask(board))
+
+
+def grid(board, name, weights=None):
+    """Return a 13x13 array, laid out like the range selector, of the
+    fraction of each hand class's weight in category `name` on `board`.
+
+    Without `weights` every combo counts equally. Cells with no live weight
+    are NaN.
+    """
+    if weights is None:
+        weights = numpy.ones(len(hand_range.combos))
+    weights = numpy.array(weights, dtype=float)
+    weights[hand_range.card_mask(board)] = 0.0
+    column = board_texture.classification_table(board)[
+        :, board_texture.category_index[name]]
+    cells = hand_range.combo_cells
+    totals = numpy.bincount(cells, weights, minlength=169)
+    hits = numpy.bincount(cells, weights*column, minlength=169)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        result = numpy.where(totals > 0, hits/totals, numpy.nan)
+    return result.reshape(13, 13)
+
+
+def write(filename, board, weights=None, file_format=None):
+    """Write the classification of every combo on `board` to a file.
+
+    A CSV file has a row for each hand with its weight (if `weights` is
+    given) and a 0 or 1 for each category. A NumPy .npy file holds the
+    (combos x categories) table itself, in the order of
+    `hand_range.combos`.
+    """
+    if file_format is None:
+        file_format = "npy" if filename.endswith(".npy") else "csv"
+    table = board_texture.classification_table(board)
+    if file_format == "npy":
+        numpy.save(filename, table)
+        return
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        header = ["hand"] + (["weight"] if weights is not None else [])
+        writer.writerow(header + board_texture.categories)
+        for i, row in enumerate(table.astype(int).tolist()):
+            hand = hand_range.hand_strings[i]
+            weight = [float(weights[i])] if weights is not None else []
+            writer.writerow([hand] + weight + row)
@@ -0,0 +1,355 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Headless command line interface. This module never imports Qt.
+
+usage: flopferret-cli texture "22+, AKs" "Ah Kd 7c" "9s8s2d"
+       flopferret-cli equity "22+, AKs" "TT+, AQs+" "Ah Kd 7c"
+       flopferret-cli combos "Ah Kd 7c" --range "22+, AKs" -c "Top Pair"
+       flopferret-cli batch < jobs.jsonl > results.jsonl
+       flopferret-cli atlas "22+, AKs" -o atlas.csv --summary classes.csv
+       flopferret-cli serve --port 8765
+
+Each batch job is a JSON object with a "range" and a "board", and optionally
+"by_river" and an "id" which is copied to the result.
+"""
+
+import argparse
+import json
+import sys
+
+import eval7
+
+from . import atlas
+from . import board_texture
+from . import classification
+from . import equity
+from . import hand_range
+from . import profiling
+from . import saved_ranges
+from . import server
+from . import texture_db
+
+# Errors caused by bad input rather than bugs.
+input_errors = (ValueError, eval7.rangestring.RangeStringError)
+
+
+def analyze(range_string, board_string, by_river=False, saved=None):
+    """Return the BoardTexture of a range on a board given as strings.
+
+    Any #tags# in the range are replaced with ranges from `saved`, and
+    unknown ones raise RangeStringError. Flops are looked up in the saved
+    range texture database if they can be.
+    """
+    hr = hand_range.HandRange(weights=compile_range(range_string, saved))
+    board = board_texture.parse_board(board_string)
+    texture = board_texture.BoardTexture()
+    totals = None
+    if not by_river:
+        totals = texture_db.lookup(hr.weights, list(map(eval7.Card, board)))
+    if totals is not None:
+        texture.update(zip(board_texture.categories, totals.tolist()))
+    else:
+        texture.calculate_from_range(hr, board, by_river=by_river)
+    return texture
+
+
+def compile_range(range_string, saved):
+    """Return the weights of `range_string`, like
+    `hand_range.compile_range`, but raise RangeStringError for a #tag# which
+    isn't a saved range rather than ignoring it."""
+    check_tags(range_string, saved)
+    return hand_range.compile_range(range_string, saved)
+
+
+def check_tags(range_string, saved):
+    """Raise RangeStringError if `range_string` uses an unknown #tag#."""
+    for tag, saved_range in hand_range.range_tags(range_string, saved or {}):
+        if saved_range is None:
+            raise eval7.rangestring.RangeStringError(
+                "Unknown saved range '#{}#'".format(tag))
+
+
+def format_texture(board_string, texture):
+    """Format a BoardTexture as a human readable table."""
+    lines = [board_string]
+    for title, names in board_texture.sections:
+        lines.append("  {}".format(title))
+        for name in names:
+            lines.append("    {:<24}{:>7.2f}%".format(name, texture[name]*100))
+    return "\n".join(lines)
+
+
+def run_texture(args):
+    saved = saved_ranges.load()
+    results = {}
+    for board_string in args.boards:
+        texture = analyze(args.range, board_string, args.by_river, saved)
+        if args.json:
+            results[board_string] = dict(texture)
+        else:
+            print(format_texture(board_string, texture))
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+def run_equity(args):
+    saved = saved_ranges.load()
+    board = board_texture.parse_board(args.board)
+    check_tags(args.hero, saved)
+    check_tags(args.villain, saved)
+    results = equity.calculate(args.hero, args.villain, board, saved)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for name in ["Equity"] + equity.outcomes:
+            print("{:<8}{:>7.2f}%".format(name, results[name]*100))
+
+
+def run_combos(args):
+    board = [eval7.Card(c) for c in board_texture.parse_board(args.board)]
+    weights = None
+    if args.range is not None:
+        weights = compile_range(args.range, saved_ranges.load())
+    if args.output:
+        classification.write(args.output, board, weights)
+    else:
+        names = args.categories or board_texture.categories
+        for name in names:
+            print("{}: {}".format(
+                name, " ".join(classification.hands(board, [name], weights))))
+
+
+def run_filter(args):
+    saved = saved_ranges.load()
+    board = [eval7.Card(c) for c in board_texture.parse_board(args.board)]
+    weights = compile_range(args.range, saved)
+    range_string = classification.filter_string(
+        board, args.categories, weights)
+    if args.save:
+        saved_ranges.save(args.save, range_string, args.folder)
+    print(range_string)
+
+
+def run_batch(args):
+    saved = saved_ranges.load()
+    for line in args.input:
+        if not line.strip():
+            continue
+        result = {}
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise TypeError("Expected a JSON object, not {!r}".format(
+                    job))
+            if "id" in job:
+                result["id"] = job["id"]
+            result["range"] = job["range"]
+            result["board"] = job["board"]
+            by_river = job.get("by_river", False)
+            if not isinstance(by_river, bool):
+                raise TypeError(
+                    "Expected true or false, not {!r}".format(by_river))
+            texture = analyze(_string(job["range"]), _string(job["board"]),
+                              by_river, saved)
+            result["result"] = dict(texture)
+        except input_errors + (KeyError, TypeError) as e:
+            result["error"] = "{}: {}".format(type(e).__name__, e)
+        args.output.write(json.dumps(result) + "\n")
+        args.output.flush()
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise TypeError("Expected a string, not {!r}".format(value))
+    return value
+
+
+def run_atlas(args):
+    saved = saved_ranges.load()
+    weights = compile_range(args.range, saved)
+
+    def progress(done, total):
+        sys.stderr.write("\r{}/{} boards".format(done, total))
+        sys.stderr.flush()
+
+    atlas.run(weights, args.output, args.format, canonical=not args.all_flops,
+              resume=args.resume, progress=progress)
+    sys.stderr.write("\n")
+    if args.summary:
+        summary = atlas.aggregate(atlas.read(args.output, args.format))
+        atlas.write_summary(summary, args.summary)
+
+
+def run_database(args):
+    built = texture_db.update(saved_ranges.load())
+    for name in built:
+        print("Built {}".format(name))
+    print("Saved range texture database is up to date.")
+
+
+def run_serve(args):
+    server.serve(args.host, args.port, args.unix_socket, args.workers)
+
+
+def run_ranges(args):
+    saved = saved_ranges.load()
+    for folder, names in sorted(saved_ranges.folders().items()):
+        if args.folder is not None and folder != args.folder:
+            continue
+        if folder:
+            print("{}/".format(folder))
+        for name in names:
+            print("{}{}: {}".format("  " if folder else "", name, saved[name]))
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="flopferret-cli",
+        description="Texas Hold'em board texture analyzer.",
+    )
+    parser.add_argument("--profile", action="store_true",
+                        help="print per-stage timings to stderr when done")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    texture = subparsers.add_parser(
+        "texture", help="analyze a range on one or more boards"
+    )
+    texture.add_argument("range", help="range string, e.g. '22+, AKs'")
+    texture.add_argument("boards", nargs="+", metavar="board",
+                         help="board, e.g. 'Ah Kd 7c' or 'AhKd7c'")
+    texture.add_argument("--by-river", action="store_true",
+                         help="average over every turn and river runout")
+    texture.add_argument("--json", action="store_true",
+                         help="write the results as JSON")
+    texture.set_defaults(run=run_texture)
+
+    equity_parser = subparsers.add_parser(
+        "equity", help="exact equity of one range against another"
+    )
+    equity_parser.add_argument("hero", help="hero's range string")
+    equity_parser.add_argument("villain", help="villain's range string")
+    equity_parser.add_argument("board", help="board, e.g. 'Ah Kd 7c'")
+    equity_parser.add_argument("--json", action="store_true",
+                               help="write the results as JSON")
+    equity_parser.set_defaults(run=run_equity)
+
+    combos = subparsers.add_parser(
+        "combos", help="list or export the category of every combo"
+    )
+    combos.add_argument("board", help="board, e.g. 'Ah Kd 7c'")
+    combos.add_argument("--range", help="only combos in this range")
+    combos.add_argument("-c", "--category", dest="categories",
+                        action="append", choices=board_texture.categories,
+                        help="list the combos in this category (default: "
+                        "every category)")
+    combos.add_argument("-o", "--output",
+                        help="write every combo's categories to a .csv or "
+                        ".npy file instead")
+    combos.set_defaults(run=run_combos)
+
+    filter_parser = subparsers.add_parser(
+        "filter", help="narrow a range to the hands in some categories"
+    )
+    filter_parser.add_argument("range", help="range string, e.g. '22+, AKs'")
+    filter_parser.add_argument("board", help="board, e.g. 'Ah Kd 7c'")
+    filter_parser.add_argument("-c", "--category", dest="categories",
+                               action="append", required=True,
+                               choices=board_texture.categories,
+                               help="keep the hands in this category (may "
+                               "be repeated)")
+    filter_parser.add_argument("--save", metavar="NAME",
+                               help="also save the range under this name")
+    filter_parser.add_argument("--folder",
+                               help="the folder to save the range in")
+    filter_parser.set_defaults(run=run_filter)
+
+    batch = subparsers.add_parser(
+        "batch", help="run JSONL jobs from stdin and write JSONL results"
+    )
+    batch.add_argument("input", nargs="?", type=argparse.FileType("r"),
+                       default=sys.stdin, help="JSONL jobs (default: stdin)")
+    batch.add_argument("-o", "--output", type=argparse.FileType("w"),
+                       default=sys.stdout,
+                       help="JSONL results (default: stdout)")
+    batch.set_defaults(run=run_batch)
+
+    atlas_parser = subparsers.add_parser(
+        "atlas", help="analyze a range on every flop"
+    )
+    atlas_parser.add_argument("range", help="range string, e.g. '22+, AKs'")
+    atlas_parser.add_argument("-o", "--output", required=True,
+                              help="output file, one row per flop")
+    atlas_parser.add_argument("--format", choices=atlas.formats,
+                              help="output format (default: from the "
+                              "output file extension, otherwise csv)")
+    atlas_parser.add_argument("--all-flops", action="store_true",
+                              help="every one of the 22,100 flops instead of "
+                              "the 1,755 suit isomorphic classes (always "
+                              "for ranges which aren't suit symmetric)")
+    atlas_parser.add_argument("--resume", action="store_true",
+                              help="continue an interrupted run, skipping "
+                              "flops already in the output file")
+    atlas_parser.add_argument("--summary",
+                              help="also write averages for each board "
+                              "class to this CSV file")
+    atlas_parser.set_defaults(run=run_atlas)
+
+    database = subparsers.add_parser(
+        "database", help="precompute every flop for the saved ranges"
+    )
+    database.set_defaults(run=run_database)
+
+    ranges = subparsers.add_parser(
+        "ranges", help="list the saved ranges by folder"
+    )
+    ranges.add_argument("folder", nargs="?",
+                        help="only list the ranges in this folder")
+    ranges.set_defaults(run=run_ranges)
+
+    serve = subparsers.add_parser(
+        "serve", help="answer texture and range requests from local tools"
+    )
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="loopback address to listen on (default: "
+                       "127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765,
+                       help="port to listen on (default: 8765)")
+    serve.add_argument("--unix-socket", metavar="PATH",
+                       help="listen on a Unix socket instead")
+    serve.add_argument("--workers", type=int,
+                       help="worker threads (default: one per CPU)")
+    serve.set_defaults(run=run_serve)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    if args.profile:
+        profiling.enable()
+    try:
+        args.run(args)
+    except input_errors as e:
+        sys.exit("flopferret-cli: error: {}".format(e))
+    finally:
+        if args.profile:
+            print(profiling.summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
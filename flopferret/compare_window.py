@@ -0,0 +1,207 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""A window comparing the board textures of several ranges."""
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from . import board_texture
+from . import calculation_thread
+from . import saved_ranges
+from . import validators
+
+
+class CompareWindow(QtWidgets.QDialog):
+    """Shows the board texture of several ranges side by side.
+
+    All of the ranges are calculated together, in one pass over the board.
+    """
+
+    # Milliseconds to wait for typing to pause before calculating.
+    calculate_delay = 100
+
+    def __init__(self, parent=None, range_strings=(), board_string=""):
+        super(CompareWindow, self).__init__(parent)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.saved_ranges = saved_ranges.load()
+        self.range_rows = []
+        self.calculate_timer = QtCore.QTimer(self)
+        self.calculate_timer.setSingleShot(True)
+        self.calculate_timer.setInterval(self.calculate_delay)
+        self.calculate_timer.timeout.connect(self.start_calculation)
+        self.calculation_thread = calculation_thread.CalculationThread(self)
+        self.calculation_thread.result_ready.connect(self.show_results)
+        self.calculation_thread.start()
+        self.calculation_id = None
+
+        self.initUI()
+        for range_string in range_strings or [""]:
+            self.add_range(range_string)
+        self.board_input.setText(board_string)
+
+    def initUI(self):
+        self.setWindowTitle("Compare Ranges")
+        self.board_input = QtWidgets.QLineEdit()
+        self.board_input.setValidator(validators.BoardValidator())
+        self.board_input.setMaximumWidth(100)
+        self.board_input.textChanged.connect(self.check_input_state)
+        self.board_input.textChanged.emit("")
+        add_button = QtWidgets.QPushButton("Add Range")
+        add_button.clicked.connect(lambda: self.add_range())
+        self.calculating_label = QtWidgets.QLabel("<i>Calculating...</i>")
+        size_policy = self.calculating_label.sizePolicy()
+        size_policy.setRetainSizeWhenHidden(True)
+        self.calculating_label.setSizePolicy(size_policy)
+        self.calculating_label.hide()
+        board_layout = QtWidgets.QHBoxLayout()
+        board_layout.addWidget(QtWidgets.QLabel("Board"))
+        board_layout.addWidget(self.board_input)
+        board_layout.addWidget(add_button)
+        board_layout.addStretch()
+        board_layout.addWidget(self.calculating_label)
+
+        self.range_layout = QtWidgets.QGridLayout()
+        self.table = QtWidgets.QTableWidget()
+        self.table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        self.table.setMinimumSize(400, 500)
+        self.rows = {}
+        labels = []
+        for title, names in board_texture.sections:
+            labels.append(title)
+            for name in names:
+                self.rows[name] = len(labels)
+                labels.append(name)
+        self.table.setRowCount(len(labels))
+        self.table.setVerticalHeaderLabels(labels)
+        bold = QtGui.QFont()
+        bold.setBold(True)
+        for title, names in board_texture.sections:
+            header = self.table.verticalHeaderItem(
+                self.rows[names[0]] - 1)
+            header.setFont(bold)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(board_layout)
+        layout.addLayout(self.range_layout)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    def add_range(self, range_string=""):
+        """Add an input for another range."""
+        range_input = QtWidgets.QLineEdit()
+        validator = validators.RangeValidator()
+        validator.saved_ranges = self.saved_ranges
+        range_input.setValidator(validator)
+        remove_button = QtWidgets.QPushButton("Remove")
+        remove_button.clicked.connect(lambda: self.remove_range(range_input))
+        row = (QtWidgets.QLabel(), range_input, remove_button)
+        self.range_rows.append(row)
+        self.layout_ranges()
+        range_input.textChanged.connect(self.check_input_state)
+        range_input.setText(range_string)
+        range_input.textChanged.emit(range_input.text())
+
+    def remove_range(self, range_input):
+        """Remove a range input, keeping at least one."""
+        if len(self.range_rows) == 1:
+            range_input.clear()
+            return
+        for row in self.range_rows:
+            if row[1] is range_input:
+                self.range_rows.remove(row)
+                for widget in row:
+                    self.range_layout.removeWidget(widget)
+                    widget.deleteLater()
+                break
+        self.layout_ranges()
+        self.calculate()
+
+    def layout_ranges(self):
+        # Number the range inputs and match the table columns to them.
+        for i, row in enumerate(self.range_rows):
+            row[0].setText(str(i + 1))
+            for column, widget in enumerate(row):
+                self.range_layout.addWidget(widget, i, column)
+        self.table.setColumnCount(len(self.range_rows))
+        self.table.setHorizontalHeaderLabels(
+            [str(i + 1) for i in range(len(self.range_rows))])
+        self.table.clearContents()
+
+    def check_input_state(self, *args, **kwargs):
+        # Check if a QLineEdit has a valid input, and set the color
+        # appropriately. Used by the range and board inputs.
+        sender = self.sender()
+        validator = sender.validator()
+        state = validator.validate(sender.text(), 0)
+        if state[0] == QtGui.QValidator.Acceptable:
+            color = '#b2ebf2'  # light blue
+        elif state[0] == QtGui.QValidator.Intermediate:
+            color = '#fff79a'  # yellow
+        else:
+            color = '#f6989d'  # red
+        sender.setStyleSheet('QLineEdit { background-color: %s }' % color)
+        self.calculate()
+
+    def calculate(self):
+        """Calculate the board textures once the inputs stop changing."""
+        self.calculate_timer.start()
+
+    def start_calculation(self):
+        """Start calculating the board textures in the calculation thread.
+
+        Ranges which aren't valid yet are left blank.
+        """
+        self.valid_columns = [
+            i for i, (label, range_input, button) in enumerate(self.range_rows)
+            if range_input.hasAcceptableInput()
+        ]
+        if not self.board_input.hasAcceptableInput() or \
+                not self.valid_columns:
+            self.calculation_thread.cancel()
+            self.calculation_id = None
+            self.calculating_label.hide()
+            self.table.clearContents()
+            return
+        range_strings = [self.range_rows[i][1].text()
+                         for i in self.valid_columns]
+        board = board_texture.parse_board(self.board_input.text())
+        self.calculation_id = self.calculation_thread.submit(
+            board_texture.calculate_ranges, range_strings, board
+        )
+        self.calculating_label.setText("<i>Calculating...</i>")
+        self.calculating_label.show()
+
+    def show_results(self, calculation_id, textures, error):
+        """Fill in the table with the latest results."""
+        if calculation_id != self.calculation_id:
+            return  # Stale result.
+        self.calculation_id = None
+        self.table.clearContents()
+        if error is not None:
+            calculation_thread.show_error(self.calculating_label, error)
+            return
+        self.calculating_label.hide()
+        for column, texture in zip(self.valid_columns, textures):
+            for name, row in self.rows.items():
+                item = QtWidgets.QTableWidgetItem(
+                    "{:.2f}%".format(100*texture[name]))
+                item.setTextAlignment(
+                    QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    def done(self, result):
+        # Closing the dialog by any means ends up here.
+        self.calculation_thread.stop()
+        super(CompareWindow, self).done(result)
@@ -0,0 +1,155 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Exact range vs range equity.
+
+Every pair of hero and villain combos which don't share a card is played out
+over every runout of the board. A pair counts with the product of its combo
+weights, so card removal is handled exactly: combos blocked by the board or
+by the other hand simply drop out.
+"""
+
+import itertools
+
+import eval7
+import numpy
+
+from . import hand_range
+from . import parallel
+from . import profiling
+
+outcomes = ["Win", "Tie", "Lose"]
+
+# Larger than any hand value, which fit in 32 bits.
+_max_value = (1 << 32) - 1
+
+
+def equity(hero_weights, villain_weights, board):
+    """Return hero's results against villain on `board`.
+
+    The result maps "Equity" (wins plus half of ties) and each of `outcomes`
+    to a fraction of the weighted matchups. They are all zero if no combos
+    can meet.
+    """
+    hero_weights = numpy.asarray(hero_weights, dtype=float)
+    villain_weights = numpy.asarray(villain_weights, dtype=float)
+    board_indices = [hand_range.card_index[card] for card in board]
+    if len(board_indices) < 3:
+        raise ValueError("Not enough cards in board!")
+    remaining = [i for i in range(52) if i not in board_indices]
+    runouts = list(itertools.combinations(remaining, 5 - len(board)))
+    hero_indices = numpy.flatnonzero(hero_weights)
+    villain_indices = numpy.flatnonzero(villain_weights)
+    if len(hero_indices) == 0 or len(villain_indices) == 0:
+        runouts = []
+    with profiling.stage("equity enumeration", len(runouts)):
+        results = parallel.map_chunks(
+            _runout_results, runouts, board_indices, hero_indices,
+            hero_weights[hero_indices], villain_weights,
+            serial=len(runouts) <= 1
+        )
+    win, tie, total = sum(results) if results else (0.0, 0.0, 0.0)
+    if total == 0.0:
+        return dict.fromkeys(["Equity"] + outcomes, 0.0)
+    return {
+        "Equity": float((win + tie/2)/total),
+        "Win": float(win/total),
+        "Tie": float(tie/total),
+        "Lose": float((total - win - tie)/total),
+    }
+
+
+def calculate(hero_range_string, villain_range_string, board_card_strings,
+              saved_ranges=None):
+    """Return the equity of one range string against another on a board."""
+    return equity(
+        hand_range.compile_range(hero_range_string, saved_ranges),
+        hand_range.compile_range(villain_range_string, saved_ranges),
+        list(map(eval7.Card, board_card_strings)),
+    )
+
+
+def _runout_results(runouts, board_indices, hero_indices, hero_weights,
+                    villain_weights):
+    # Return the weighted (win, tie, total) sums over `runouts`.
+    #
+    # Rather than compare every pair of combos, villain's combos are sorted
+    # by hand value, so the weight villain has below (or equal to) each hero
+    # hand is a binary search. Villain combos sharing a card with the hero
+    # combo are taken out by doing the same search among the combos holding
+    # each of hero's cards, and adding back the hero combo itself, which was
+    # taken out twice.
+    combo_cards = hand_range.combo_cards
+    villain_indices = numpy.flatnonzero(villain_weights)
+    indices = numpy.union1d(hero_indices, villain_indices)
+    hands = [list(hand_range.combos[i]) for i in indices]
+    results = numpy.zeros(3)
+    values = numpy.zeros(len(hand_range.combos), dtype=numpy.int64)
+    for runout in runouts:
+        dead = numpy.zeros(52, dtype=bool)
+        dead[board_indices] = True
+        dead[list(runout)] = True
+        board = [hand_range.cards[i] for i in board_indices + list(runout)]
+        live = ~(dead[combo_cards[indices, 0]] | dead[combo_cards[indices, 1]])
+        with profiling.stage("equity evaluate", int(live.sum())):
+            values[indices[live]] = [
+                eval7.evaluate(board + hand)
+                for hand, is_live in zip(hands, live.tolist()) if is_live
+            ]
+        live_combos = numpy.zeros(len(hand_range.combos), dtype=bool)
+        live_combos[indices[live]] = True
+
+        v = villain_indices[live_combos[villain_indices]]
+        v_weights = villain_weights[v]
+        order = numpy.argsort(values[v], kind="stable")
+        v_values = values[v][order]
+        v_cumulative = numpy.concatenate([[0.0], v_weights[order].cumsum()])
+        # The same, grouped by card: each combo is listed under both cards.
+        card_keys = numpy.concatenate([combo_cards[v, 0], combo_cards[v, 1]])
+        card_keys = (card_keys << 32) | numpy.concatenate([values[v]]*2)
+        card_order = numpy.argsort(card_keys, kind="stable")
+        card_keys = card_keys[card_order]
+        card_cumulative = numpy.concatenate([
+            [0.0], numpy.concatenate([v_weights]*2)[card_order].cumsum()
+        ])
+
+        h = hero_indices[live_combos[hero_indices]]
+        h_weights = hero_weights[live_combos[hero_indices]]
+        h_values = values[h]
+        h_cards = combo_cards[h].T
+        starts = [numpy.searchsorted(card_keys, card << 32)
+                  for card in h_cards]
+
+        def weight_below(limits, side):
+            # Villain weight below (side "left") or up to ("right") `limits`,
+            # leaving out combos which share a card with hero's.
+            weight = v_cumulative[numpy.searchsorted(v_values, limits, side)]
+            for card, start in zip(h_cards, starts):
+                end = numpy.searchsorted(
+                    card_keys, (card << 32) | limits, side)
+                weight -= card_cumulative[end] - card_cumulative[start]
+            return weight
+
+        less = weight_below(h_values, "left")
+        # Hero's own combo was taken out twice, and always ties.
+        less_or_equal = weight_below(h_values, "right") + villain_weights[h]
+        total = weight_below(
+            numpy.full(len(h), _max_value), "right") + villain_weights[h]
+        results += [
+            h_weights.dot(less),
+            h_weights.dot(less_or_equal - less),
+            h_weights.dot(total),
+        ]
+    return results
@@ -0,0 +1,120 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""A dialog deriving a new range from the hands in texture categories."""
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+import eval7
+
+from . import board_texture
+from . import classification
+from . import hand_range
+from . import saved_ranges
+
+
+class FilterWindow(QtWidgets.QDialog):
+    """Filters a range down to the hands in the checked categories.
+
+    Any #tags# in the range are replaced with ranges from `saved`. The
+    filtered range can be saved under a name, or the dialog accepted to use
+    it as the range.
+
+    usage: window = FilterWindow(parent, "22+, AKs", ["Ah", "Kd", "7c"])
+           if window.exec_():
+               print(window.range_string())
+    """
+
+    def __init__(self, parent, range_string, board_card_strings,
+                 saved=None):
+        super(FilterWindow, self).__init__(parent)
+        self.weights = hand_range.compile_range(range_string, saved)
+        self.board = list(map(eval7.Card, board_card_strings))
+        self.blocked = hand_range.card_mask(self.board)
+        self.filtered = ""
+        self.initUI()
+        self.setWindowTitle("Filter: {} on {}".format(
+            range_string, " ".join(board_card_strings)))
+        self.update_filter()
+
+    def initUI(self):
+        self.category_boxes = {}
+        sections_layout = QtWidgets.QHBoxLayout()
+        for title, names in board_texture.sections:
+            group = QtWidgets.QGroupBox(title)
+            group_layout = QtWidgets.QVBoxLayout()
+            for name in names:
+                box = QtWidgets.QCheckBox(name)
+                box.stateChanged.connect(self.update_filter)
+                group_layout.addWidget(box)
+                self.category_boxes[name] = box
+            group_layout.addStretch()
+            group.setLayout(group_layout)
+            sections_layout.addWidget(group)
+
+        self.result_output = QtWidgets.QLineEdit()
+        self.result_output.setReadOnly(True)
+        self.count_label = QtWidgets.QLabel()
+
+        self.name_input = QtWidgets.QLineEdit()
+        self.name_input.setPlaceholderText("Name")
+        re = QtCore.QRegExp(r"^\w{1,12}$")
+        self.name_input.setValidator(QtGui.QRegExpValidator(re))
+        self.save_button = QtWidgets.QPushButton("Save")
+        self.save_button.clicked.connect(self.save_range)
+        self.use_button = QtWidgets.QPushButton("Use as Range")
+        self.use_button.clicked.connect(self.accept)
+        cancel_button = QtWidgets.QPushButton("Cancel")
+        cancel_button.clicked.connect(self.reject)
+        button_layout = QtWidgets.QHBoxLayout()
+        button_layout.addWidget(self.name_input)
+        button_layout.addWidget(self.save_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.use_button)
+        button_layout.addWidget(cancel_button)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(sections_layout)
+        layout.addWidget(self.result_output)
+        layout.addWidget(self.count_label)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def names(self):
+        """Return the checked categories."""
+        return [name for name in board_texture.categories
+                if self.category_boxes[name].isChecked()]
+
+    def update_filter(self):
+        """Filter the range by the checked categories."""
+        names = self.names()
+        weights = classification.filter_range(self.board, names, self.weights)
+        self.filtered = hand_range.range_string(weights, self.blocked)
+        self.result_output.setText(self.filtered)
+        total = self.weights[~self.blocked].sum()
+        kept = weights[~self.blocked].sum()
+        self.count_label.setText("{:g} of {:g} combos ({:.2f}%)".format(
+            kept, total, 100*kept/total if total else 0.0))
+        self.use_button.setEnabled(bool(self.filtered))
+        self.save_button.setEnabled(bool(self.filtered))
+
+    def range_string(self):
+        """Return the filtered range string."""
+        return self.filtered
+
+    def save_range(self):
+        """Save the filtered range under the name entered."""
+        if not self.name_input.hasAcceptableInput():
+            return
+        saved_ranges.save(self.name_input.text(), self.filtered)
@@ -13,46 +13,296 @@
 #
 # You should have received a copy of the GNU General Public License
 
+import collections.abc
+import functools
 
 import eval7
+import numpy
 
+from . import profiling
 
-class HandRange(dict):
+# The deck in eval7 order, so card i has rank i//4 and suit i%4.
+cards = list(eval7.Deck().cards)
+card_index = {card: i for i, card in enumerate(cards)}
+
+# Every hand, with the higher card (by deck order) first. The position of a
+# hand in this list is its index in every HandRange weight array.
+combos = [(cards[j], cards[i]) for i in range(52) for j in range(i+1, 52)]
+combo_index = {}
+# The hand string of each combo, e.g. "AsKh".
+hand_strings = [str(high) + str(low) for (high, low) in combos]
+# Combo indices by hand string, e.g. "AsKh" or "KhAs".
+hand_index = {}
+for i, (high, low) in enumerate(combos):
+    combo_index[(high, low)] = i
+    combo_index[(low, high)] = i
+    hand_index[str(high) + str(low)] = i
+    hand_index[str(low) + str(high)] = i
+
+# Deck indices of the cards in each combo.
+combo_cards = numpy.array(
+    [(card_index[high], card_index[low]) for (high, low) in combos],
+    dtype=numpy.intp
+)
+# card_combos[c] is a mask of the combos containing card index c.
+card_combos = numpy.zeros((52, len(combos)), dtype=bool)
+card_combos[combo_cards[:, 0], numpy.arange(len(combos))] = True
+card_combos[combo_cards[:, 1], numpy.arange(len(combos))] = True
+
+
+def _grid_cell(high, low):
+    # The cell of the 13x13 hand grid for a hand, as row*13 + column. Aces
+    # are top left, with pairs on the diagonal, suited hands above it and
+    # offsuit hands below.
+    high_row, low_row = 12 - high.rank, 12 - low.rank
+    if high.suit == low.suit:
+        return 13*high_row + low_row
+    return 13*low_row + high_row
+
+
+# grid_labels[cell] is the hand class of each grid cell, e.g. "AKs".
+grid_labels = []
+for _row in range(13):
+    for _column in range(13):
+        grid_labels.append(
+            eval7.rangestring.ranks[12 - min(_row, _column)] +
+            eval7.rangestring.ranks[12 - max(_row, _column)] +
+            ('s' if _row < _column else 'o' if _row > _column else '')
+        )
+# The grid cell of each hand class.
+cell_index = {label: cell for cell, label in enumerate(grid_labels)}
+# The grid cell of each combo.
+combo_cells = numpy.array([_grid_cell(high, low) for (high, low) in combos],
+                          dtype=numpy.intp)
+# The combos in each grid cell.
+cell_combos = [numpy.flatnonzero(combo_cells == cell) for cell in range(169)]
+for _array in [combo_cards, card_combos, combo_cells] + cell_combos:
+    _array.setflags(write=False)
+
+
+def card_mask(cards):
+    """Return a mask of the combos which contain any of `cards`."""
+    indices = [card_index[card] for card in cards]
+    if not indices:
+        return numpy.zeros(len(combos), dtype=bool)
+    return card_combos[indices].any(axis=0)
+
+
+@functools.lru_cache(maxsize=1024)
+def range_tokens(range_string):
+    """Return a tuple of the (token, weight) pairs in `range_string`, or None
+    if it can't be parsed."""
+    try:
+        return tuple(eval7.rangestring.string_to_tokens(range_string))
+    except eval7.rangestring.RangeStringError:
+        return None
+
+
+def range_tags(range_string, saved_ranges):
+    """Return the sorted (tag, saved range string) pairs `range_string`
+    depends on, including tags used by the saved ranges themselves.
+
+    Unknown tags map to None. Raise RangeStringError if a saved range refers
+    to itself.
+    """
+    result = {}
+
+    def visit(s, path):
+        for tag in s.split('#')[1::2]:
+            if tag in path:
+                raise eval7.rangestring.RangeStringError(
+                    "Saved range '{}' refers to itself".format(tag)
+                )
+            saved = saved_ranges.get(tag)
+            result[tag] = saved
+            if saved is not None:
+                visit(saved, path + (tag, ))
+
+    visit(range_string, ())
+    return tuple(sorted(result.items()))
+
+
+def compile_range(range_string, saved_ranges=None):
+    """Return the weights of `range_string` as a read-only array.
+
+    Each #tag# adds the weights of the saved range it names (from the
+    `saved_ranges` dict) times the tag's weight. Unknown tags are ignored.
+    Results are cached by the range string together with the saved ranges it
+    uses, so editing a saved range invalidates everything depending on it.
+    """
+    return _compile(range_string, range_tags(range_string, saved_ranges or {}))
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(range_string, tags):
+    with profiling.stage("range parsing"):
+        return _compile_tokens(range_string, tags)
+
+
+def _compile_tokens(range_string, tags):
+    tokens = range_tokens(range_string)
+    if tokens is None:
+        raise eval7.rangestring.RangeStringError("Failed to parse string")
+    saved_ranges = dict(tags)
+    weights = numpy.zeros(len(combos))
+    indices = []
+    hand_weights = []
+    for token, weight in tokens:
+        if token.startswith('#'):
+            saved = saved_ranges.get(token[1:-1])
+            if saved is not None:
+                weights += weight * _compile(saved, tags)
+            continue
+        for hand in eval7.rangestring.token_to_hands(token):
+            indices.append(hand_index[''.join(hand)])
+            hand_weights.append(weight)
+    numpy.add.at(weights, indices, hand_weights)
+    weights.setflags(write=False)
+    return weights
+
+
+def range_string(weights, dead=None):
+    """Return a range string for the combo `weights`.
+
+    Weights are rounded to whole percentages, the precision of the string.
+    A hand class whose combos all have the same weight is written as one
+    token, e.g. "AKs", and any other combos as single hands. Combos in the
+    `dead` mask, such as those blocked by the board, may have any weight, so
+    classes with a blocked card can still be written as one token.
+    """
+    percents = numpy.rint(100*numpy.asarray(weights, dtype=float))
+    percents = percents.astype(int)
+    groups = {}
+    for cell, indices in enumerate(cell_combos):
+        if dead is not None:
+            indices = indices[~dead[indices]]
+        cell_percents = percents[indices]
+        if len(indices) and cell_percents[0] > 0 and \
+                (cell_percents == cell_percents[0]).all():
+            groups.setdefault(int(cell_percents[0]), []).append(
+                grid_labels[cell])
+            continue
+        for i, percent in zip(indices.tolist(), cell_percents.tolist()):
+            if percent > 0:
+                groups.setdefault(percent, []).append(hand_strings[i])
+    # eval7 truncates the weights it formats, so each group is formatted as
+    # a full weight range and given its percentage here. Full weight first.
+    strings = []
+    for percent in sorted(groups, key=lambda p: (p != 100, -p)):
+        string = eval7.rangestring.tokens_to_string(
+            [(token, 1.0) for token in groups[percent]])
+        if percent != 100:
+            string = "{}%({})".format(percent, string)
+        strings.append(string)
+    return ", ".join(strings)
+
+
+profiling.register_cache("range tokens", range_tokens)
+profiling.register_cache("compiled ranges", _compile)
+
+
+def clear_caches():
+    """Empty the range parsing and compilation caches."""
+    range_tokens.cache_clear()
+    _compile.cache_clear()
+
+
+class HandRange(collections.abc.Mapping):
     """A class to store a weighted range of hands. Each hand is a pair
-    of cards with the higher card (by deck order) first."""
-    def __init__(self, range_string=None):
-        super(HandRange, self).__init__(self)
-        self._set_zeros()
+    of cards with the higher card (by deck order) first.
+
+    Weights are stored in the `weights` array, indexed like `combos`, and
+    are as given by the range string until `normalize` is called.
+    """
+    def __init__(self, range_string=None, weights=None):
+        if weights is None:
+            self.weights = numpy.zeros(len(combos))
+        else:
+            self.weights = numpy.array(weights, dtype=float)
+            if self.weights.shape != (len(combos), ):
+                raise ValueError("Expected {} weights".format(len(combos)))
         if range_string is not None:
             self._from_str(range_string)
 
     def _from_str(self, range_string):
-        # Load range from range-string.
-        hand_str_list = eval7.rangestring.string_to_hands(range_string)
-        for hand, weight in hand_str_list:
-            self[hand] += weight
-        self.normalize()
-
-    def _set_zeros(self):
-        # Initialize range with zeros.
-        deck = eval7.Deck()
-        for i, card in enumerate(deck[:-1]):
-            for other_card in deck[i+1:]:
-                self[(other_card, card)] = 0.0  # Higher card must be first!
+        # Load range from range-string. Tags should already be expanded, so
+        # any left over are ignored.
+        self.weights += compile_range(range_string)
+
+    def __getitem__(self, hand):
+        return float(self.weights[combo_index[hand]])
+
+    def __setitem__(self, hand, weight):
+        self.weights[combo_index[hand]] = weight
+
+    def __iter__(self):
+        return iter(combos)
+
+    def __len__(self):
+        return len(combos)
+
+    def __eq__(self, other):
+        if isinstance(other, HandRange):
+            return numpy.array_equal(self.weights, other.weights)
+        return super(HandRange, self).__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "<HandRange: {:g} combos>".format(self.combo_count())
+
+    def items(self):
+        return zip(combos, self.weights.tolist())
+
+    def values(self):
+        return self.weights.tolist()
+
+    def copy(self):
+        return HandRange(weights=self.weights)
+
+    def range_string(self, dead=None):
+        """Return a range string for the range. See `range_string`."""
+        return range_string(self.weights, dead)
 
     def normalize(self):
         """Normalize the hand range. Return the original total."""
-        total = sum(self.values())
+        total = float(self.weights.sum())
         if not total == 0.0:
-            N = 1.0/total
-            for hand, weight in self.items():
-                self[hand] = weight*N
+            self.weights /= total
         return total
 
     def exclude_cards(self, cards):
         """Remove `cards` from range and renormalize."""
-        for hand in self:
-            for card in cards:
-                if card in hand:
-                    self[hand] = 0.0
+        self.weights[card_mask(cards)] = 0.0
         return self.normalize()
+
+    def scale(self, factor):
+        """Multiply every weight by `factor`. Return self."""
+        self.weights *= factor
+        return self
+
+    def combo_count(self, weighted=True):
+        """Return the number of combos in the range.
+
+        If `weighted` each combo counts for its weight, otherwise every combo
+        with a non-zero weight counts for one.
+        """
+        if weighted:
+            return float(self.weights.sum())
+        return int(numpy.count_nonzero(self.weights))
+
+    def __or__(self, other):
+        """Union: the larger of the two weights for each combo."""
+        return HandRange(weights=numpy.maximum(self.weights, other.weights))
+
+    def __and__(self, other):
+        """Intersection: the smaller of the two weights for each combo."""
+        return HandRange(weights=numpy.minimum(self.weights, other.weights))
+
+    def __sub__(self, other):
+        """Subtraction: weights reduced by `other`, but never below zero."""
+        weights = numpy.clip(self.weights - other.weights, 0.0, None)
+        return HandRange(weights=weights)
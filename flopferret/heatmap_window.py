@@ -0,0 +1,138 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""A 13x13 heatmap of which hands fall in a board texture category."""
+
+import math
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+import eval7
+
+from . import board_texture
+from . import classification
+from . import hand_range
+
+
+class HeatmapWidget(QtWidgets.QWidget):
+    """A 13x13 hand grid shaded by a value between 0 and 1 for each cell.
+
+    The whole grid is drawn in one paint pass. Cells with a NaN value (no
+    hands) are left blank.
+
+    usage: wid = HeatmapWidget()
+           wid.setValues(classification.grid(board, "Flush"))
+    """
+
+    cell_size = 36
+
+    def __init__(self, color='#00BED4'):
+        super(HeatmapWidget, self).__init__()
+        self.color = QtGui.QColor(color)
+        self.values = [[math.nan]*13 for i in range(13)]
+        self.setFixedSize(13*self.cell_size + 1, 13*self.cell_size + 1)
+
+    def setValues(self, values):
+        """Set the 13x13 values to display, and schedule a repaint."""
+        self.values = [list(row) for row in values]
+        self.update()
+
+    def paintEvent(self, event):
+        qp = QtGui.QPainter()
+        qp.begin(self)
+        self.drawWidget(qp)
+        qp.end()
+
+    def drawWidget(self, qp):
+        size = self.cell_size
+        empty = self.palette().color(QtGui.QPalette.Window)
+        grid_pen = QtGui.QPen(QtGui.QColor('#9e9e9e'))
+        text_pen = QtGui.QPen(QtGui.QColor('#000000'))
+        font = qp.font()
+        if font.pointSizeF() > 0:
+            font.setPointSizeF(font.pointSizeF()*0.8)
+            qp.setFont(font)
+        for row in range(13):
+            for column in range(13):
+                rect = QtCore.QRect(column*size, row*size, size, size)
+                value = self.values[row][column]
+                if math.isnan(value):
+                    fill = empty
+                else:
+                    # Blend from white to the full color.
+                    fill = QtGui.QColor(
+                        *[int(round(255 + (c - 255)*value))
+                          for c in self.color.getRgb()[:3]])
+                qp.setPen(grid_pen)
+                qp.setBrush(QtGui.QBrush(fill))
+                qp.drawRect(rect)
+                qp.setPen(text_pen)
+                label = hand_range.grid_labels[13*row + column]
+                if not math.isnan(value):
+                    label += "\n{:.0f}%".format(100*value)
+                qp.drawText(rect, QtCore.Qt.AlignCenter, label)
+
+
+class HeatmapWindow(QtWidgets.QDialog):
+    """Shows which hands of a range fall in a category on a board."""
+
+    def __init__(self, parent, range_string, board_card_strings):
+        super(HeatmapWindow, self).__init__(parent)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.weights = hand_range.compile_range(range_string)
+        self.board = list(map(eval7.Card, board_card_strings))
+        self.initUI()
+        self.setWindowTitle("Heatmap: {} on {}".format(
+            range_string, " ".join(board_card_strings)))
+        self.update_heatmap()
+
+    def initUI(self):
+        self.category_box = QtWidgets.QComboBox()
+        self.category_box.addItems(board_texture.categories)
+        self.category_box.currentIndexChanged.connect(self.update_heatmap)
+        export_button = QtWidgets.QPushButton("Export...")
+        export_button.clicked.connect(self.export)
+        self.count_label = QtWidgets.QLabel()
+        top_layout = QtWidgets.QHBoxLayout()
+        top_layout.addWidget(self.category_box)
+        top_layout.addWidget(self.count_label)
+        top_layout.addStretch()
+        top_layout.addWidget(export_button)
+        self.heatmap = HeatmapWidget()
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(top_layout)
+        layout.addWidget(self.heatmap)
+        self.setLayout(layout)
+
+    def update_heatmap(self):
+        """Show the heatmap for the selected category."""
+        name = self.category_box.currentText()
+        self.heatmap.setValues(
+            classification.grid(self.board, name, self.weights))
+        weights = self.weights.copy()
+        weights[hand_range.card_mask(self.board)] = 0.0
+        in_category = float(weights[
+            classification.mask(self.board, [name], weights)].sum())
+        total = weights.sum()
+        self.count_label.setText("{:g} combos ({:.2f}%)".format(
+            in_category, 100*in_category/total if total else 0.0))
+
+    def export(self):
+        """Save the classification of every combo to a file."""
+        filename, selected = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export Combos", "combos.csv",
+            "CSV files (*.csv);;NumPy arrays (*.npy)"
+        )
+        if filename:
+            classification.write(filename, self.board, self.weights)
@@ -0,0 +1,74 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Suit permutations of boards and hand ranges.
+
+Boards which differ only by a relabelling of the suits (e.g. AhKh2c and
+AsKs2d) have the same texture for any range which treats the suits the same.
+Boards are identified by sorted tuples of deck indices, and the canonical
+board is the smallest such tuple over all 24 suit permutations.
+"""
+
+import itertools
+
+import numpy
+
+from . import hand_range
+
+suit_permutations = list(itertools.permutations(range(4)))
+
+# card_permutations[p, c] is the deck index of card c under permutation p.
+card_permutations = numpy.array([
+    [4*(c//4) + perm[c % 4] for c in range(52)]
+    for perm in suit_permutations
+], dtype=numpy.intp)
+
+_pair_index = numpy.zeros((52, 52), dtype=numpy.intp)
+_pair_index[hand_range.combo_cards[:, 0], hand_range.combo_cards[:, 1]] = \
+    numpy.arange(len(hand_range.combos))
+_pair_index[hand_range.combo_cards[:, 1], hand_range.combo_cards[:, 0]] = \
+    numpy.arange(len(hand_range.combos))
+
+# combo_permutations[p, i] is the combo index of combo i under permutation p.
+combo_permutations = _pair_index[
+    card_permutations[:, hand_range.combo_cards[:, 0]],
+    card_permutations[:, hand_range.combo_cards[:, 1]]
+]
+
+# A swap and a four cycle generate every suit permutation.
+_generators = combo_permutations[[
+    suit_permutations.index((1, 0, 2, 3)),
+    suit_permutations.index((1, 2, 3, 0)),
+]]
+
+for _array in (card_permutations, combo_permutations):
+    _array.setflags(write=False)
+
+
+def canonical_board(board):
+    """Return the canonical board key of `board` and the index of the suit
+    permutation which maps `board` onto it."""
+    indices = [hand_range.card_index[card] for card in board]
+    permuted = card_permutations[:, indices]
+    permuted.sort(axis=1)
+    keys = [tuple(row) for row in permuted.tolist()]
+    key = min(keys)
+    return key, keys.index(key)
+
+
+def is_suit_symmetric(weights):
+    """Return True if combo `weights` are unchanged by every suit
+    permutation."""
+    return bool((weights[_generators] == weights).all())
@@ -0,0 +1,149 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Precomputed rank and suit tables for the board texture classifiers.
+
+Ranks are stored as 13 bit masks (bit r set for rank r, deuce is rank 0).
+Suit counts are packed three bits per suit, which is enough for seven cards.
+Whole sets of cards are packed as a rank mask for each suit, 13 bits per suit.
+"""
+
+rank_bits = [1 << r for r in range(13)]
+suit_shifts = [1 << (3*s) for s in range(4)]
+
+straight_draw_names = [None, "OESD", "Gutshot"]
+
+# The rank masks of the ten straights, from the wheel up to broadway.
+straight_masks = [rank_bits[12] | 15] + [31 << r for r in range(9)]
+
+
+def rank_mask(cards):
+    """Return the rank bitmask of `cards`."""
+    mask = 0
+    for card in cards:
+        mask |= rank_bits[card.rank]
+    return mask
+
+
+def suit_key(cards):
+    """Return the packed suit counts of `cards`."""
+    key = 0
+    for card in cards:
+        key += suit_shifts[card.suit]
+    return key
+
+
+def suit_rank_mask(cards):
+    """Return the rank masks of each suit in `cards`, packed 13 bits per
+    suit."""
+    mask = 0
+    for card in cards:
+        mask |= 1 << (13*card.suit + card.rank)
+    return mask
+
+
+def _straight_draw(mask):
+    # Classify a rank mask as 0 (no draw), 1 (OESD), or 2 (Gutshot).
+    bits = mask << 1
+    if mask & rank_bits[12]:
+        bits |= 1  # Bottom bit represents the low ace.
+
+    # Look for '11110' or '1011101' (Open Ended Straight Draw)
+    for i in range(9):
+        s = bits >> i
+        if s & 31 == 30 or s & 127 == 93:
+            return 1
+
+    # Look for Gutshot bit patterns
+    for i in range(10):
+        if (bits >> i) & 31 in (30, 29, 27, 23, 15):
+            return 2
+    return 0
+
+
+def _max_suit_count(key):
+    return max((key >> (3*s)) & 7 for s in range(4))
+
+
+def _high_rank(mask):
+    return mask.bit_length() - 1
+
+
+def _second_rank(mask):
+    return _high_rank(mask & ~(1 << _high_rank(mask))) if mask else -1
+
+
+def _straight_windows(mask):
+    # Return a bit for each straight with at least three of its ranks in
+    # `mask`, so which two more cards could complete.
+    windows = 0
+    for i, straight in enumerate(straight_masks):
+        if bin(mask & straight).count("1") >= 3:
+            windows |= 1 << i
+    return windows
+
+
+def _straight_high(windows):
+    # Return the high rank of the highest straight in a set of straights, or
+    # -1 if there are none.
+    highs = [i + 3 for i in range(len(straight_masks)) if windows >> i & 1]
+    return highs[-1] if highs else -1
+
+
+def _best_straights(mask):
+    # Return the high ranks of the distinct best straights made with `mask`
+    # and any two more cards, best first.
+    if not 3 <= bin(mask).count("1") <= 5:
+        return []
+    highs = {straight_highs[mask | rank_bits[r1] | rank_bits[r2]]
+             for r1 in range(13) for r2 in range(r1, 13)}
+    return sorted(highs - {-1}, reverse=True)
+
+
+def _flush_suit(key):
+    for s in range(4):
+        if (key >> (3*s)) & 7 >= 5:
+            return s
+    return -1
+
+
+# Index into straight_draw_names by rank mask.
+straight_draws = [_straight_draw(mask) for mask in range(1 << 13)]
+# Largest number of cards of any one suit by packed suit counts.
+max_suit_counts = [_max_suit_count(key) for key in range(1 << 12)]
+# Highest and second highest rank in a rank mask, or -1 if there is none.
+high_ranks = [_high_rank(mask) for mask in range(1 << 13)]
+second_ranks = [_second_rank(mask) for mask in range(1 << 13)]
+# Number of ranks in a rank mask.
+bit_counts = [bin(mask).count("1") for mask in range(1 << 13)]
+# The ranks above each rank, by rank + 1 so that index 0 is every rank.
+ranks_above = [((1 << 13) - 1) & ~((1 << r) - 1) for r in range(14)]
+# The straights which are three cards or more complete, by rank mask.
+straight_windows = [_straight_windows(mask) for mask in range(1 << 13)]
+# High rank of the best straight made with a rank mask, or -1 if there is
+# none.
+straight_highs = [
+    _straight_high(sum(1 << i for i, straight in enumerate(straight_masks)
+                       if mask & straight == straight))
+    for mask in range(1 << 13)
+]
+# High ranks of the best and second best straights a player can make with a
+# board rank mask and any two more cards, or -1 if there are none.
+_best_straight_highs = [_best_straights(mask) for mask in range(1 << 13)]
+nut_straights = [highs[0] if highs else -1 for highs in _best_straight_highs]
+second_nut_straights = [
+    highs[1] if len(highs) > 1 else -1 for highs in _best_straight_highs]
+# The suit with five or more cards by packed suit counts, or -1 if none.
+flush_suits = [_flush_suit(key) for key in range(1 << 12)]
@@ -15,23 +15,79 @@
 
 """Main Board Texture Analyzer Gui"""
 
+import os
+
 from PyQt5 import QtCore, QtGui, QtWidgets
 import eval7
 
 from . import board_texture
+from . import calculation_thread
+from . import compare_window
+from . import equity
+from . import filter_window
+from . import hand_range
+from . import heatmap_window
+from . import monte_carlo
+from . import next_card_window
 from . import percent_display
+from . import profile_panel
 from . import range_selector
 from . import saved_ranges
+from . import texture_db
+from . import validators
 
 
 class MainWindow(QtWidgets.QWidget):
     """The Main Window of the Application."""
 
+    # Milliseconds to wait for typing to pause before calculating.
+    calculate_delay = 100
+    # Standard error to stop sampling at, and the most seconds to sample for.
+    sample_precision = 0.001
+    sample_time_limit = 10.0
+    # Whether to precompute every flop for the saved ranges in the
+    # background, so they can be looked up instantly, unless the setting
+    # says otherwise.
+    precompute_saved_ranges = False
+    # Milliseconds for the result bars to slide to new values, or 0 to
+    # jump straight to them.
+    result_animation = 150
+
     def __init__(self):
         super(MainWindow, self).__init__()
         self.board_texture = board_texture.BoardTexture()
+        self.calculate_timer = QtCore.QTimer(self)
+        self.calculate_timer.setSingleShot(True)
+        self.calculate_timer.setInterval(self.calculate_delay)
+        self.calculate_timer.timeout.connect(self.start_calculation)
+        self.calculate_timer.timeout.connect(self.start_equity_calculation)
+        self.calculation_thread = calculation_thread.CalculationThread(self)
+        self.calculation_thread.result_ready.connect(self.show_results)
+        self.calculation_thread.progress_ready.connect(self.show_progress)
+        self.calculation_thread.start()
+        self.calculation_id = None
+        # Equity runs in its own thread so it doesn't hold up the texture.
+        self.equity_thread = calculation_thread.CalculationThread(self)
+        self.equity_thread.result_ready.connect(self.show_equity)
+        self.equity_thread.progress_ready.connect(self.show_equity_progress)
+        self.equity_thread.start()
+        self.equity_id = None
+        self.database_thread = calculation_thread.CalculationThread(self)
+        self.database_thread.start()
+        self.settings = QtCore.QSettings(
+            os.path.join(saved_ranges.config_dir, "settings.ini"),
+            QtCore.QSettings.IniFormat, self)
+        self.precompute_saved_ranges = self.settings.value(
+            "precompute_saved_ranges", self.precompute_saved_ranges,
+            type=bool)
+        # Notices other windows and programs changing the saved ranges.
+        self.saved_ranges_watcher = QtCore.QFileSystemWatcher(self)
+        self.saved_ranges_watcher.directoryChanged.connect(
+            self.saved_ranges_changed)
 
         self.initUI()
+        self.watch_saved_ranges()
+        self.update_texture_database()
 
     def initUI(self):
         # Build the window UI and show it.
@@ -40,34 +96,91 @@ class MainWindow(QtWidgets.QWidget):
         main_layout = QtWidgets.QVBoxLayout(self)
         input_layout = self.make_input_layout()
         output_layout = self.make_output_layout()
+        equity_layout = self.make_equity_layout()
 
         main_layout.addLayout(input_layout)
         main_layout.addLayout(output_layout)
+        main_layout.addLayout(equity_layout)
 
         self.setLayout(main_layout)
         QtWidgets.QShortcut(
             QtGui.QKeySequence("Ctrl+Q"), self
         ).activated.connect(self.close)
+        QtWidgets.QShortcut(
+            QtGui.QKeySequence("Ctrl+Shift+P"), self
+        ).activated.connect(self.show_profile_panel)
+        self.profile_panel = None
+        # Settings are in the window's right click menu.
+        precompute_action = QtWidgets.QAction(
+            "Precompute Saved Ranges", self, checkable=True)
+        precompute_action.setChecked(self.precompute_saved_ranges)
+        precompute_action.toggled.connect(self.set_precompute_saved_ranges)
+        self.addAction(precompute_action)
+        self.setContextMenuPolicy(QtCore.Qt.ActionsContextMenu)
         self.show()
 
     def make_input_layout(self):
         # Build the layout for the inputs.
         self.range_input = QtWidgets.QLineEdit()
-        self.range_validator = RangeValidator()
+        self.range_validator = validators.RangeValidator()
         self.range_validator.saved_ranges = saved_ranges.load()
         self.range_input.setValidator(self.range_validator)
         self.board_input = QtWidgets.QLineEdit()
-        self.board_input.setValidator(BoardValidator())
+        self.board_input.setValidator(validators.BoardValidator())
         self.board_input.setMaximumWidth(100)
         set_range_button = QtWidgets.QPushButton("Set Range")
         set_range_button.clicked.connect(self.set_range)
         board_label = QtWidgets.QLabel("Board")
+        self.by_river_box = QtWidgets.QCheckBox("By the river")
+        self.by_river_box.setToolTip(
+            "Show what the range has at showdown, over every runout."
+        )
+        self.by_river_box.stateChanged.connect(self.calculate)
+        self.sample_box = QtWidgets.QCheckBox("Estimate")
+        self.sample_box.setToolTip(
+            "Sample random runouts for the by the river and equity results, "
+            "refining them as it goes."
+        )
+        self.sample_box.stateChanged.connect(self.calculate)
+        self.calculating_label = QtWidgets.QLabel("<i>Calculating...</i>")
+        # Keep the space reserved so the layout doesn't jump around.
+        size_policy = self.calculating_label.sizePolicy()
+        size_policy.setRetainSizeWhenHidden(True)
+        self.calculating_label.setSizePolicy(size_policy)
+        self.calculating_label.hide()
+        compare_button = QtWidgets.QPushButton("Compare Ranges")
+        compare_button.clicked.connect(self.compare_ranges)
+        self.next_card_button = QtWidgets.QPushButton("Next Card")
+        self.next_card_button.setToolTip(
+            "Show how the texture changes with each turn or river card."
+        )
+        self.next_card_button.clicked.connect(self.explore_next_cards)
+        heatmap_button = QtWidgets.QPushButton("Heatmap")
+        heatmap_button.setToolTip(
+            "Show which hands fall in each category on the grid."
+        )
+        heatmap_button.clicked.connect(self.show_heatmap)
+        filter_button = QtWidgets.QPushButton("Filter Range")
+        filter_button.setToolTip(
+            "Make a new range from the hands in some categories."
+        )
+        filter_button.clicked.connect(self.filter_range)
+        board_layout = QtWidgets.QHBoxLayout()
+        board_layout.addWidget(self.board_input)
+        board_layout.addWidget(self.by_river_box)
+        board_layout.addWidget(self.sample_box)
+        board_layout.addStretch()
+        board_layout.addWidget(self.calculating_label)
+        board_layout.addWidget(compare_button)
+        board_layout.addWidget(self.next_card_button)
+        board_layout.addWidget(heatmap_button)
+        board_layout.addWidget(filter_button)
 
         layout = QtWidgets.QGridLayout()
         layout.addWidget(set_range_button, 0, 0)
         layout.addWidget(self.range_input, 0, 1)
         layout.addWidget(board_label, 1, 0)
-        layout.addWidget(self.board_input, 1, 1)
+        layout.addLayout(board_layout, 1, 1)
         self.range_input.textChanged.connect(self.check_input_state)
         self.range_input.textChanged.emit("")
         self.board_input.textChanged.connect(self.check_input_state)
@@ -76,37 +189,52 @@ class MainWindow(QtWidgets.QWidget):
 
     def make_output_layout(self):
         # Build the layout for the outputs.
-        layout = QtWidgets.QGridLayout()
-        # Store a dictionary of PercentDisplay outputs for easy update.
-        self.outputs = {}
-        for name, probability in self.board_texture.items():
-            output = percent_display.PercentDisplayWidget(
-                probability, max_bar_width=100, color="#00BED4"
-            )
-            self.outputs[name] = output
-
-        def add_output(name, row, column):
-            label = QtWidgets.QLabel(name)
-            label.setContentsMargins(30, 0, 0, 0)
-            layout.addWidget(label, row, column)
-            layout.addWidget(self.outputs[name], row, column+1)
-
-        # Add base hand type outputs to layout
-        hand_type_label = QtWidgets.QLabel("<b>Hand Type Breakdown</b>")
-        layout.addWidget(hand_type_label, 0, 0, 1, 2)
-        for i, name in enumerate(board_texture.hand_types):
-            add_output(name, i+1, 0)
-        # Add pair breakdown outputs
-        pair_label = QtWidgets.QLabel("<b>Pair Breakdown</b>")
-        layout.addWidget(pair_label, 0, 2, 1, 2)
-        for i, name in enumerate(board_texture.pair_types):
-            add_output(name, i+1, 2)
-        # Add draw breakdown outputs
-        draw_label = QtWidgets.QLabel("<b>Draw Breakdown</b>")
-        layout.addWidget(draw_label, i+2, 2, 1, 2)
-        for j, name in enumerate(board_texture.draw_types):
-            add_output(name, i+j+3, 2)
+        # Lay out the sections in three columns: hand types, then pairs and
+        # draws, then the extra draws and nut hands.
+        columns = [[], [], []]
+        for section, column in zip(board_texture.sections, [0, 1, 1, 2, 2]):
+            columns[column].append(section)
+        self.results_panel = percent_display.ResultsPanel(
+            columns, max_bar_width=100, color="#00BED4",
+            animation_duration=self.result_animation
+        )
+        self.results_panel.setValues(self.board_texture)
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.results_panel)
+        layout.addStretch()
+        return layout
+
+    def make_equity_layout(self):
+        # Build the layout for the range vs range equity panel.
+        self.villain_input = QtWidgets.QLineEdit()
+        self.villain_validator = validators.RangeValidator()
+        self.villain_validator.saved_ranges = self.range_validator.saved_ranges
+        self.villain_input.setValidator(self.villain_validator)
+        villain_button = QtWidgets.QPushButton("Villain Range")
+        villain_button.clicked.connect(self.set_villain_range)
+        self.equity_label = QtWidgets.QLabel("<i>Calculating...</i>")
+        size_policy = self.equity_label.sizePolicy()
+        size_policy.setRetainSizeWhenHidden(True)
+        self.equity_label.setSizePolicy(size_policy)
+        self.equity_label.hide()
 
+        layout = QtWidgets.QGridLayout()
+        title_layout = QtWidgets.QHBoxLayout()
+        title_layout.addWidget(QtWidgets.QLabel("<b>Equity</b>"))
+        title_layout.addStretch()
+        title_layout.addWidget(self.equity_label)
+        layout.addLayout(title_layout, 0, 0, 1, 4)
+        layout.addWidget(villain_button, 1, 0)
+        layout.addWidget(self.villain_input, 1, 1, 1, 3)
+        names = ["Equity"] + equity.outcomes
+        self.equity_panel = percent_display.ResultsPanel(
+            [[(None, names[0::2])], [(None, names[1::2])]],
+            max_bar_width=100, color="#00BED4",
+            animation_duration=self.result_animation
+        )
+        layout.addWidget(self.equity_panel, 2, 0, 1, 4)
+        self.villain_input.textChanged.connect(self.check_input_state)
+        self.villain_input.textChanged.emit("")
         return layout
 
     def check_input_state(self, *args, **kwargs):
@@ -124,106 +252,253 @@ class MainWindow(QtWidgets.QWidget):
         sender.setStyleSheet('QLineEdit { background-color: %s }' % color)
         self.calculate()
 
+    def show_profile_panel(self):
+        """Open the profiling debug panel."""
+        if self.profile_panel is None:
+            self.profile_panel = profile_panel.ProfilePanel(self)
+        self.profile_panel.show()
+        self.profile_panel.raise_()
+
     def set_range(self):
         """Open a RangeSelector dialog to set range_input"""
+        self.select_range(self.range_input)
+
+    def set_villain_range(self):
+        """Open a RangeSelector dialog to set villain_input"""
+        self.select_range(self.villain_input)
+
+    def select_range(self, range_input):
+        # Open a RangeSelector dialog to set a range input.
         selector = range_selector.RangeSelector(self)
-        range_string = self.range_input.text()
-        validator = self.range_input.validator()
+        range_string = range_input.text()
+        validator = range_input.validator()
         if validator.validate(range_string, 0)[0] == validator.Acceptable:
             selector.set_from_range_string(range_string)
         if selector.exec_():
             # Update the range input on success
             new_range_string = selector.range_string()
-            self.range_input.setText(new_range_string)
-        # Reload saved_ranges in case updated by selector.
+            range_input.setText(new_range_string)
+        self.reload_saved_ranges()
+
+    def reload_saved_ranges(self):
+        # Reload saved_ranges in case updated by a dialog.
         self.range_validator.saved_ranges = saved_ranges.load()
+        self.villain_validator.saved_ranges = self.range_validator.saved_ranges
+        self.watch_saved_ranges()
+        self.update_texture_database()
+
+    def watch_saved_ranges(self):
+        # Watch the directory rather than the file, since saving replaces
+        # the file.
+        if os.path.isdir(saved_ranges.config_dir) and \
+                not self.saved_ranges_watcher.directories():
+            self.saved_ranges_watcher.addPath(saved_ranges.config_dir)
+
+    def saved_ranges_changed(self, path):
+        # Reload the saved ranges if they've been changed elsewhere.
+        if saved_ranges.load() != self.range_validator.saved_ranges:
+            self.reload_saved_ranges()
+
+    def update_texture_database(self):
+        """Bring the saved range texture database up to date in the
+        background. The database is only an optimization, so failures are
+        ignored."""
+        if self.precompute_saved_ranges:
+            self.database_thread.submit(
+                texture_db.update, dict(self.range_validator.saved_ranges))
+        else:
+            self.database_thread.cancel()
+            texture_db.clear_caches()
+
+    def set_precompute_saved_ranges(self, precompute):
+        """Turn precomputing the saved range textures on or off, and
+        remember the choice."""
+        self.precompute_saved_ranges = precompute
+        self.settings.setValue("precompute_saved_ranges", precompute)
+        self.update_texture_database()
+
+    def compare_ranges(self):
+        """Open a CompareWindow starting from the current inputs."""
+        window = compare_window.CompareWindow(
+            self, [self.range_input.text()], self.board_input.text()
+        )
+        window.show()
+
+    def explore_next_cards(self):
+        """Open a NextCardWindow for the current range and board."""
+        if not self.range_input.hasAcceptableInput() or \
+                not self.board_input.hasAcceptableInput():
+            return
+        board = board_texture.parse_board(self.board_input.text())
+        if len(board) == 5:
+            return
+        window = next_card_window.NextCardWindow(
+            self, self.range_input.text(), board
+        )
+        window.show()
+
+    def show_heatmap(self):
+        """Open a HeatmapWindow for the current range and board."""
+        if not self.range_input.hasAcceptableInput() or \
+                not self.board_input.hasAcceptableInput():
+            return
+        window = heatmap_window.HeatmapWindow(
+            self, self.range_input.text(),
+            board_texture.parse_board(self.board_input.text())
+        )
+        window.show()
+
+    def filter_range(self):
+        """Open a FilterWindow to narrow the range by category."""
+        if not self.range_input.hasAcceptableInput() or \
+                not self.board_input.hasAcceptableInput():
+            return
+        window = filter_window.FilterWindow(
+            self, self.range_input.text(),
+            board_texture.parse_board(self.board_input.text()),
+            self.range_validator.saved_ranges
+        )
+        if window.exec_():
+            self.range_input.setText(window.range_string())
+        self.reload_saved_ranges()
 
     def calculate(self):
-        """Calculate the board texture and display the results."""
+        """Calculate the board texture once the inputs stop changing."""
+        self.calculate_timer.start()
+
+    def start_calculation(self):
+        """Start calculating the board texture in the calculation thread."""
         if not self.range_input.hasAcceptableInput() or \
                 not self.board_input.hasAcceptableInput():
+            self.calculation_thread.cancel()
+            self.calculation_id = None
+            self.calculating_label.hide()
             return
         range_string = self.range_input.text()
-        board_string = self.board_input.text().replace(" ", "")
-        board = [board_string[i:i+2] for i in range(0, len(board_string)-1, 2)]
-        self.board_texture.calculate(range_string, board)
-        for key, output in self.outputs.items():
-            output.setValue(self.board_texture[key])
-
-
-class RangeValidator(QtGui.QValidator):
-    """Validator for range input."""
-
-    def validate(self, s, pos):
-        if eval7.rangestring.validate_string(s):
-            # Replace tags with saved ranges.
-            tags = s.split('#')[1::2]
-            for tag in tags:
-                new_str = self.saved_ranges.get(tag)
-                if new_str is not None:
-                    s = s.replace("#{}#".format(tag), new_str)
-                    pos = len(s)
-            # fix case of tokens
-            in_tag = False
-            new_s = ""
-            for c in s:
-                if c == '#':
-                    # A parseable string always has properly completed tags.
-                    in_tag = not in_tag
-                if not in_tag and c in ''.join(eval7.rangestring.ranks).lower():
-                    c = c.upper()
-                new_s += c
-            return (QtGui.QValidator.Acceptable, new_s, pos)
+        board = board_texture.parse_board(self.board_input.text())
+        by_river = self.by_river_box.isChecked()
+        if by_river and self.sample_box.isChecked() and len(board) < 5:
+            self.calculation_id = self.calculation_thread.submit(
+                monte_carlo.texture_estimates, range_string, board,
+                self.sample_precision, self.sample_time_limit
+            )
         else:
-            # Accept any other input as intermediate.
-            return (QtGui.QValidator.Intermediate, s, pos)
-        return (QtGui.QValidator.Intermediate, s, pos)
-
-
-class BoardValidator(QtGui.QRegExpValidator):
-    """Validator for board input."""
-    _rank_str = ''.join(eval7.rangestring.ranks) + \
-                ''.join(eval7.rangestring.ranks).lower()
-    _suit_str = ''.join(eval7.rangestring.suits)
-    # A card is a rank and a suit.
-    _card_re_str = "[{}][{}]".format(_rank_str, _suit_str)
-    # A board is 3-5 cards, optionally with spaces between them.
-    _board_re = QtCore.QRegExp("({}( *)?){{3,5}}".format(_card_re_str))
-    # A partial card is a card, a rank, or a suit.
-    _partial_card_re_str = "(({})|[{}]|[{}])".format(
-        _card_re_str, _rank_str, _suit_str
-    )
-    # A sequence of partial cards is an intermediate match.
-    _partial_board_re = QtCore.QRegExp("({}( *)?){{0,5}}".format(
-        _partial_card_re_str))
+            self.calculation_id = self.calculation_thread.submit(
+                calculate_texture, range_string, board, by_river
+            )
+        self.calculating_label.setText("<i>Calculating...</i>")
+        self.calculating_label.show()
 
-    def __init__(self):
-        super(BoardValidator, self).__init__(self._board_re)
-
-    def _get_card_strings(self, s):
-        stripped = s.replace(' ', '')
-        card_strings = [stripped[i:i+2].capitalize()
-                        for i in range(0, len(stripped) - 1, 2)]
-        if any(card_strings.count(x) > 1 for x in card_strings):
-            return None
-        else:
-            return card_strings
-
-    def validate(self, s, pos):
-        result, s, new_pos = super(BoardValidator, self).validate(s, pos)
-        if result == QtGui.QValidator.Invalid:
-            # Partial cards are intermediate.
-            if self._partial_board_re.exactMatch(s):
-                result = QtGui.QValidator.Intermediate
-                new_pos = pos
+    def show_progress(self, calculation_id, estimate):
+        """Display a partial result of the latest calculation."""
+        if calculation_id != self.calculation_id:
+            return  # Stale result.
+        show_estimate(self.results_panel, estimate)
+        self.calculating_label.setText(
+            "<i>Sampling... {:,} runouts</i>".format(estimate.samples))
+
+    def show_results(self, calculation_id, texture, error):
+        """Display the results of the latest calculation."""
+        if calculation_id != self.calculation_id:
+            return  # Stale result.
+        self.calculation_id = None
+        if error is not None:
+            calculation_thread.show_error(self.calculating_label, error)
+            return
+        self.calculating_label.hide()
+        if isinstance(texture, monte_carlo.Estimate):
+            show_estimate(self.results_panel, texture)
+            self.board_texture = board_texture.BoardTexture()
+            self.board_texture.update(texture.values)
+            return
+        self.show_texture(texture)
+
+    def show_texture(self, texture):
+        # Display an exact BoardTexture.
+        self.board_texture = texture
+        self.results_panel.setValues(self.board_texture)
+        self.results_panel.setToolTips({})
+
+    def start_equity_calculation(self):
+        """Start calculating the equity against the villain range."""
+        if not self.range_input.hasAcceptableInput() or \
+                not self.villain_input.hasAcceptableInput() or \
+                not self.board_input.hasAcceptableInput():
+            self.equity_thread.cancel()
+            self.equity_id = None
+            self.equity_label.hide()
+            return
+        board = board_texture.parse_board(self.board_input.text())
+        if self.sample_box.isChecked() and len(board) < 5:
+            self.equity_id = self.equity_thread.submit(
+                monte_carlo.equity_estimates, self.range_input.text(),
+                self.villain_input.text(), board, self.sample_precision,
+                self.sample_time_limit
+            )
         else:
-            card_strings = self._get_card_strings(s)
-            if card_strings is None:
-                # Duplicate cards are invalid.
-                result = QtGui.QValidator.Invalid
-            elif result == QtGui.QValidator.Acceptable:
-                # Reposition to account for the inserted spaces.
-                stripped_pos = len(s[:new_pos].replace(' ', ''))
-                new_pos = stripped_pos + (stripped_pos - 1)//2
-                s = ' '.join(card_strings)
-        return (result, s, new_pos)
+            self.equity_id = self.equity_thread.submit(
+                equity.calculate, self.range_input.text(),
+                self.villain_input.text(), board
+            )
+        self.equity_label.setText("<i>Calculating...</i>")
+        self.equity_label.show()
+
+    def show_equity_progress(self, equity_id, estimate):
+        """Display a partial result of the latest equity calculation."""
+        if equity_id != self.equity_id:
+            return  # Stale result.
+        show_estimate(self.equity_panel, estimate)
+        self.equity_label.setText(
+            "<i>Sampling... {:,} runouts</i>".format(estimate.samples))
+
+    def show_equity(self, equity_id, results, error):
+        """Display the results of the latest equity calculation."""
+        if equity_id != self.equity_id:
+            return  # Stale result.
+        self.equity_id = None
+        if error is not None:
+            calculation_thread.show_error(self.equity_label, error)
+            return
+        self.equity_label.hide()
+        if isinstance(results, monte_carlo.Estimate):
+            show_estimate(self.equity_panel, results)
+            return
+        self.equity_panel.setValues(results)
+        self.equity_panel.setToolTips({})
+
+    def closeEvent(self, event):
+        for window in self.findChildren(
+                (compare_window.CompareWindow,
+                 next_card_window.NextCardWindow)):
+            window.close()
+        self.calculation_thread.stop()
+        self.equity_thread.stop()
+        self.database_thread.stop()
+        super(MainWindow, self).closeEvent(event)
+
+
+def show_estimate(panel, estimate):
+    """Show a Monte Carlo Estimate on a ResultsPanel, with the standard
+    errors as tool tips."""
+    # Sampling noise can't push a value out of range.
+    panel.setValues({name: min(max(estimate.values[name], 0.0), 1.0)
+                     for name in panel.names})
+    panel.setToolTips({
+        name: "\u00b1{:.2f}% (standard error, {:,} samples)".format(
+            estimate.errors[name]*100, estimate.samples)
+        for name in panel.names
+    })
+
+
+def calculate_texture(range_string, board, by_river):
+    """Return the BoardTexture of a range on a board."""
+    texture = board_texture.BoardTexture()
+    if not by_river:
+        totals = texture_db.lookup(hand_range.compile_range(range_string),
+                                   list(map(eval7.Card, board)))
+        if totals is not None:
+            # A saved range on a flop, so no need to calculate.
+            texture.update(zip(board_texture.categories, totals.tolist()))
+            return texture
+    texture.calculate(range_string, board, by_river=by_river)
+    return texture
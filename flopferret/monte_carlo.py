@@ -0,0 +1,237 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Anytime Monte Carlo estimates of the expensive analyses.
+
+A sampler deals batches of random hands and runouts. `estimate` keeps
+sampling until every standard error is within the requested precision or the
+time limit is up, yielding the refined estimate after each batch so it can be
+displayed as it improves.
+
+usage: for result in estimate(texture_sampler(weights, board),
+                              board_texture.categories, precision=0.002):
+           print(result.samples, result.values["Flush"])
+"""
+
+import collections
+import time
+
+import eval7
+import numpy
+
+from . import board_texture
+from . import equity
+from . import hand_range
+from . import lookup_tables
+from . import parallel
+from . import profiling
+
+# The estimated values and their standard errors, by name, the number of
+# samples they are from, and whether sampling has finished.
+Estimate = collections.namedtuple(
+    "Estimate", ["values", "errors", "samples", "done"]
+)
+
+equity_names = ["Equity"] + equity.outcomes
+
+# Seconds a batch should take at most. Batches grow until they take about
+# this long, so progress is reported regularly without much overhead.
+batch_time = 0.05
+
+_card_masks = numpy.array(
+    [lookup_tables.suit_rank_mask([card]) for card in hand_range.cards],
+    dtype=numpy.int64)
+
+
+def estimate(sampler, names, precision=0.001, time_limit=None,
+             min_samples=1000, seed=None):
+    """Yield Estimates of `names` from `sampler` as they are refined.
+
+    `sampler(count, rng)` returns the sums, and the sums of squares, of each
+    of `names` over `count` random samples. Sampling stops once there are at
+    least `min_samples` samples and every standard error is at most
+    `precision`, or after `time_limit` seconds. The last Estimate yielded has
+    `done` set.
+    """
+    if precision is None and time_limit is None:
+        raise ValueError("Sampling needs a precision or a time limit!")
+    rng = numpy.random.default_rng(seed)
+    sums = numpy.zeros(len(names))
+    squares = numpy.zeros(len(names))
+    samples = 0
+    count = 256
+    start = time.perf_counter()
+    while True:
+        parallel.check_cancelled()
+        batch_start = time.perf_counter()
+        batch_sums, batch_squares = sampler(count, rng)
+        sums += batch_sums
+        squares += batch_squares
+        samples += count
+        means = sums/samples
+        variances = numpy.maximum(squares/samples - means**2, 0.0)
+        errors = numpy.sqrt(variances/samples)
+        now = time.perf_counter()
+        done = (
+            precision is not None and samples >= min_samples and
+            errors.max() <= precision
+        ) or (time_limit is not None and now - start >= time_limit)
+        yield Estimate(dict(zip(names, means.tolist())),
+                       dict(zip(names, errors.tolist())), samples, done)
+        if done:
+            return
+        if now - batch_start < batch_time/2:
+            count *= 2
+
+
+def deal(rng, count, dead, hand_cards, size):
+    """Return a (count x size) array of random cards for each of `count`
+    deals, avoiding the `dead` cards and each deal's row of `hand_cards`."""
+    if size == 0:
+        return numpy.zeros((count, 0), dtype=int)
+    # The cards with the smallest random keys are a random sample of the
+    # cards which aren't pushed out of reach.
+    keys = rng.random((count, 52))
+    keys[:, dead] = 2.0
+    keys[numpy.arange(count)[:, None], hand_cards] = 2.0
+    return numpy.argpartition(keys, size - 1, axis=1)[:, :size]
+
+
+def texture_sampler(weights, board):
+    """Return a sampler of the categories the combo `weights` make on random
+    runouts of `board` to the river."""
+    weights = numpy.array(weights, dtype=float)
+    board_indices = [hand_range.card_index[card] for card in board]
+    weights[hand_range.card_mask(board)] = 0.0
+    indices = numpy.flatnonzero(weights)
+    probabilities = weights[indices]/weights[indices].sum() \
+        if len(indices) else None
+    size = 5 - len(board_indices)
+    zeros = numpy.zeros(len(board_texture.categories))
+
+    def sample(count, rng):
+        if probabilities is None:
+            return zeros, zeros
+        combos = rng.choice(indices, count, p=probabilities)
+        hand_cards = hand_range.combo_cards[combos]
+        runouts = deal(rng, count, board_indices, hand_cards, size)
+        with profiling.stage("sample evaluate", count):
+            values = _evaluate(board, runouts, combos)
+        with profiling.stage("sample classification", count):
+            board_masks = numpy.bitwise_or.reduce(
+                _card_masks[runouts], axis=1
+            ) | lookup_tables.suit_rank_mask(board)
+            columns = board_texture.classify_deals(
+                values, numpy.arange(count), board_masks, hand_cards
+            )[1]
+            counts = numpy.bincount(
+                columns, minlength=len(board_texture.categories)
+            ).astype(float)
+        # Every category is a zero or a one, so the squares are the same.
+        return counts, counts
+
+    return sample
+
+
+def equity_sampler(hero_weights, villain_weights, board):
+    """Return a sampler of hero's `equity_names` results against villain on
+    random runouts of `board`."""
+    board_indices = [hand_range.card_index[card] for card in board]
+    blocked = hand_range.card_mask(board)
+    hero_weights = numpy.array(hero_weights, dtype=float)
+    villain_weights = numpy.array(villain_weights, dtype=float)
+    hero_weights[blocked] = 0.0
+    villain_weights[blocked] = 0.0
+    size = 5 - len(board_indices)
+    zeros = numpy.zeros(len(equity_names))
+    # Check some matchups don't share a card. Summing over cards counts the
+    # matchups sharing a card once, except identical combos, which share two.
+    card_combos = hand_range.card_combos
+    shared = card_combos.dot(hero_weights).dot(
+        card_combos.dot(villain_weights)
+    ) - hero_weights.dot(villain_weights)
+    if hero_weights.sum()*villain_weights.sum() - shared <= 1e-12:
+        return lambda count, rng: (zeros, zeros)
+    hero_indices = numpy.flatnonzero(hero_weights)
+    hero_p = hero_weights[hero_indices]/hero_weights[hero_indices].sum()
+    villain_indices = numpy.flatnonzero(villain_weights)
+    villain_p = villain_weights[villain_indices] / \
+        villain_weights[villain_indices].sum()
+
+    def sample(count, rng):
+        hero = rng.choice(hero_indices, count, p=hero_p)
+        villain = rng.choice(villain_indices, count, p=villain_p)
+        # Redeal both hands when they share a card. This samples the
+        # matchups in proportion to their weights.
+        while True:
+            hero_cards = hand_range.combo_cards[hero]
+            villain_cards = hand_range.combo_cards[villain]
+            clashes = numpy.flatnonzero(
+                (hero_cards[:, :, None] == villain_cards[:, None, :])
+                .any(axis=(1, 2))
+            )
+            if not len(clashes):
+                break
+            hero[clashes] = rng.choice(hero_indices, len(clashes), p=hero_p)
+            villain[clashes] = rng.choice(
+                villain_indices, len(clashes), p=villain_p)
+        runouts = deal(rng, count, board_indices,
+                       numpy.hstack([hero_cards, villain_cards]), size)
+        with profiling.stage("sample evaluate", 2*count):
+            hero_values = _evaluate(board, runouts, hero)
+            villain_values = _evaluate(board, runouts, villain)
+        wins = (hero_values > villain_values).sum()
+        ties = (hero_values == villain_values).sum()
+        losses = count - wins - ties
+        sums = numpy.array([wins + ties/2, wins, ties, losses], dtype=float)
+        squares = numpy.array([wins + ties/4, wins, ties, losses],
+                              dtype=float)
+        return sums, squares
+
+    return sample
+
+
+def _evaluate(board, runouts, combos):
+    # Return the hand values of each combo on the board with its runout.
+    cards = hand_range.cards
+    combo_list = hand_range.combos
+    return numpy.array([
+        eval7.evaluate(board + [cards[i] for i in runout] +
+                       list(combo_list[combo]))
+        for runout, combo in zip(runouts.tolist(), combos.tolist())
+    ], dtype=numpy.int64)
+
+
+def texture_estimates(range_string, board_card_strings, precision=0.001,
+                      time_limit=None):
+    """Yield improving Estimates of what a range has on a board by the
+    river. See `estimate` for the stopping rule."""
+    board = list(map(eval7.Card, board_card_strings))
+    return estimate(
+        texture_sampler(hand_range.compile_range(range_string), board),
+        board_texture.categories, precision, time_limit
+    )
+
+
+def equity_estimates(hero_range_string, villain_range_string,
+                     board_card_strings, precision=0.001, time_limit=None):
+    """Yield improving Estimates of the equity of one range against another
+    on a board. See `estimate` for the stopping rule."""
+    board = list(map(eval7.Card, board_card_strings))
+    return estimate(
+        equity_sampler(hand_range.compile_range(hero_range_string),
+                       hand_range.compile_range(villain_range_string), board),
+        equity_names, precision, time_limit
+    )
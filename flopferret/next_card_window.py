@@ -0,0 +1,166 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""A window exploring how the texture changes with the next card."""
+
+from PyQt5 import QtCore, QtWidgets
+import eval7
+
+from . import board_texture
+from . import calculation_thread
+from . import hand_range
+from . import next_cards
+
+
+class SortableItem(QtWidgets.QTableWidgetItem):
+    """A table item which sorts by its sort key rather than its text."""
+
+    def __init__(self, text="", sort_key=-1.0):
+        super(SortableItem, self).__init__(text)
+        self.sort_key = sort_key
+        self.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+
+class NextCardWindow(QtWidgets.QDialog):
+    """Shows the texture of a range after each possible turn or river card.
+
+    Cards are calculated in the background, those scrolled into view first.
+    Double clicking a turn card shows the river cards after it, and the
+    table can be sorted by any column.
+    """
+
+    def __init__(self, parent, range_string, board_card_strings):
+        super(NextCardWindow, self).__init__(parent)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.range_string = range_string
+        self.weights = hand_range.compile_range(range_string)
+        self.flop = list(map(eval7.Card, board_card_strings))
+        self.explorers = {}
+        self.explorer = None
+        self.calculation_thread = calculation_thread.CalculationThread(self)
+        self.calculation_thread.progress_ready.connect(self.show_card)
+        self.calculation_thread.start()
+        self.calculation_id = None
+
+        self.initUI()
+        self.set_board(self.flop)
+
+    def initUI(self):
+        self.setWindowTitle("Next Card")
+        self.board_label = QtWidgets.QLabel()
+        self.back_button = QtWidgets.QPushButton("Back")
+        self.back_button.clicked.connect(lambda: self.set_board(self.flop))
+        top_layout = QtWidgets.QHBoxLayout()
+        top_layout.addWidget(self.board_label)
+        top_layout.addStretch()
+        top_layout.addWidget(self.back_button)
+
+        self.table = QtWidgets.QTableWidget(
+            0, len(board_texture.categories) + 1)
+        self.table.setHorizontalHeaderLabels(
+            ["Card"] + board_texture.categories)
+        self.table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QtWidgets.QTableWidget.SelectRows)
+        self.table.verticalHeader().hide()
+        self.table.setMinimumSize(800, 400)
+        self.table.cellDoubleClicked.connect(self.open_card)
+        self.table.verticalScrollBar().valueChanged.connect(self.calculate)
+        self.table.horizontalHeader().sortIndicatorChanged.connect(
+            self.calculate)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(top_layout)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    def set_board(self, board):
+        """Show the cards which can come next on `board`."""
+        key = board_texture.board_key(board)
+        if key not in self.explorers:
+            self.explorers[key] = next_cards.NextCards(self.weights, board)
+        self.explorer = self.explorers[key]
+        street = "Turn" if len(board) == 3 else "River"
+        self.board_label.setText("<b>{} cards</b> for {} on {}".format(
+            street, self.range_string, " ".join(map(str, board))))
+        self.back_button.setEnabled(len(board) > len(self.flop))
+        self.calculation_thread.cancel()
+        self.calculation_id = None
+
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(self.explorer.cards))
+        self.items = {}
+        for row, card in enumerate(self.explorer.cards):
+            card_item = SortableItem(str(card), hand_range.card_index[card])
+            card_item.setData(QtCore.Qt.UserRole, str(card))
+            self.table.setItem(row, 0, card_item)
+            items = [SortableItem() for name in board_texture.categories]
+            for column, item in enumerate(items):
+                self.table.setItem(row, column + 1, item)
+            self.items[str(card)] = items
+            totals = self.explorer.result(card)
+            if totals is not None:
+                self.fill_row(items, totals)
+        self.table.setSortingEnabled(True)
+        self.calculate()
+
+    def open_card(self, row, column):
+        """Show the river cards after a turn card."""
+        if len(self.explorer.board) + 1 < 5:
+            card = eval7.Card(self.table.item(row, 0).data(QtCore.Qt.UserRole))
+            self.set_board(self.explorer.board + [card])
+
+    def visible_cards(self):
+        # The cards in table order, with the rows in view first.
+        cards = [
+            eval7.Card(self.table.item(row, 0).data(QtCore.Qt.UserRole))
+            for row in range(self.table.rowCount())
+        ]
+        first = max(self.table.rowAt(0), 0)
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = len(cards) - 1
+        return cards[first:last + 1] + cards[:first] + cards[last + 1:]
+
+    def calculate(self):
+        """Calculate any missing cards, those in view first."""
+        order = [card for card in self.visible_cards()
+                 if self.explorer.result(card) is None]
+        if not order:
+            return
+        self.calculation_id = self.calculation_thread.submit(
+            self.explorer.iterate, order
+        )
+
+    def show_card(self, calculation_id, result):
+        """Fill in the row for a newly calculated card."""
+        if calculation_id != self.calculation_id:
+            return  # Stale result.
+        card, totals = result
+        items = self.items.get(str(card))
+        if items is not None and not items[0].text():
+            self.fill_row(items, totals)
+
+    def fill_row(self, items, totals):
+        for item, value in zip(items, totals.tolist()):
+            item.sort_key = value
+            item.setText("{:.2f}%".format(100*value))
+
+    def done(self, result):
+        # Closing the dialog by any means ends up here.
+        self.calculation_thread.stop()
+        super(NextCardWindow, self).done(result)
@@ -0,0 +1,82 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""How a range's board texture changes with the next card.
+
+usage: explorer = NextCards(weights, board)
+       for card, totals in explorer.iterate():
+           print(card, totals[board_texture.category_index["Flush"]])
+"""
+
+import numpy
+
+from . import board_texture
+from . import hand_range
+from . import isomorphism
+from . import parallel
+
+
+class NextCards(object):
+    """The board texture of a range after each card which can come next.
+
+    Results are calculated lazily, a few cards at a time in the order they
+    are asked for, and kept, so asking again in a different order only
+    calculates the cards which are new. Each batch of cards is classified
+    as one card runouts of the current board, the same way as the runouts
+    of `board_texture.by_river_totals`, so the board and the range's live
+    combos on it are worked out once, and each card only evaluates those
+    combos. For suit symmetric ranges, cards making suit isomorphic boards
+    share one calculation.
+    """
+
+    def __init__(self, weights, board):
+        if len(board) >= 5:
+            raise ValueError("There are no more cards after the river!")
+        weights = numpy.array(weights, dtype=float)
+        weights[hand_range.card_mask(board)] = 0.0
+        self.weights = weights
+        self.board = list(board)
+        self.cards = [card for card in hand_range.cards
+                      if card not in self.board]
+        self.symmetric = isomorphism.is_suit_symmetric(weights)
+        self._results = {}
+
+    def key(self, card):
+        """Return the key results for `card` are stored under."""
+        board = self.board + [card]
+        if self.symmetric:
+            return isomorphism.canonical_board(board)[0]
+        return board_texture.board_key(board)
+
+    def result(self, card):
+        """Return the totals for `card` if they have been calculated."""
+        return self._results.get(self.key(card))
+
+    def iterate(self, order=None, chunk_size=8):
+        """Yield (card, totals) for each card in `order` (by default every
+        card which can come next), calculating `chunk_size` new boards at a
+        time."""
+        order = self.cards if order is None else list(order)
+        for start in range(0, len(order), chunk_size):
+            parallel.check_cancelled()
+            chunk = order[start:start + chunk_size]
+            new = [card for card in chunk if self.result(card) is None]
+            if new:
+                totals = board_texture.next_card_totals(
+                    self.weights, self.board, new)
+                for card, row in zip(new, totals):
+                    self._results[self.key(card)] = row
+            for card in chunk:
+                yield card, self.result(card)
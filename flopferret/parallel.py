@@ -0,0 +1,159 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""A shared process pool for the expensive enumerations.
+
+The workers are started by a fork server (or spawned, where there is none),
+so like any multiprocessing program, a script using the pool needs the
+`if __name__ == "__main__":` guard.
+"""
+
+import atexit
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
+import threading
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+# Workers are never forked from the calling process itself, which may have
+# other threads running (Qt's, or the server's) that forking would copy in a
+# broken state.
+_start_method = "forkserver" \
+    if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class Cancelled(Exception):
+    """Raised when the current calculation is cancelled."""
+
+
+def cpu_count():
+    return os.cpu_count() or 1
+
+
+def executor():
+    """Return the shared process pool, starting it if necessary."""
+    global _executor
+    # Calculations can start from several threads at once (in the server).
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ProcessPoolExecutor(
+                cpu_count(),
+                mp_context=multiprocessing.get_context(_start_method))
+            atexit.register(shutdown)
+        return _executor
+
+
+def shutdown():
+    """Shut down the shared process pool if it was started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def chunks(items, count):
+    """Split `items` into at most `count` nearly equal lists."""
+    items = list(items)
+    count = max(1, min(count, len(items)))
+    size, extra = divmod(len(items), count)
+    result = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        result.append(items[start:end])
+        start = end
+    return result
+
+
+@contextlib.contextmanager
+def cancellation(cancelled):
+    """Let calculations in this thread be cancelled.
+
+    `cancelled` is a function returning True once the result is no longer
+    wanted, at which point map_chunks (or check_cancelled) raises Cancelled.
+    """
+    previous = getattr(_local, "cancelled", None)
+    _local.cancelled = cancelled
+    try:
+        yield
+    finally:
+        _local.cancelled = previous
+
+
+def check_cancelled():
+    """Raise Cancelled if the current calculation has been cancelled."""
+    cancelled = getattr(_local, "cancelled", None)
+    if cancelled is not None and cancelled():
+        raise Cancelled()
+
+
+def map_chunks(function, items, *args, serial=False):
+    """Call `function(chunk, *args)` for chunks of `items` and return the
+    results in order.
+
+    Chunks are spread over the shared process pool unless `serial` is true or
+    there is only one CPU, in which case they run in this process.
+    """
+    # A few chunks per process keeps the workers evenly loaded, and lets a
+    # cancelled calculation stop early.
+    item_chunks = chunks(items, 4*cpu_count())
+    if serial or cpu_count() == 1:
+        results = []
+        for chunk in item_chunks:
+            check_cancelled()
+            results.append(function(chunk, *args))
+        return results
+    futures = [executor().submit(function, chunk, *args)
+               for chunk in item_chunks]
+    try:
+        while True:
+            done, pending = concurrent.futures.wait(futures, timeout=0.05)
+            if not pending:
+                break
+            check_cancelled()
+    except Cancelled:
+        for future in futures:
+            future.cancel()
+        raise
+    return [future.result() for future in futures]
+
+
+def imap_chunks(function, items, *args, chunk_size=16, serial=False):
+    """Call `function(chunk, *args)` for chunks of `items`, yielding
+    (chunk, result) pairs as each chunk finishes.
+
+    Results come in completion order, so they can be streamed. Chunks which
+    haven't started are cancelled if the generator is closed early.
+    """
+    items = list(items)
+    item_chunks = [items[i:i+chunk_size]
+                   for i in range(0, len(items), chunk_size)]
+    if serial or cpu_count() == 1:
+        for chunk in item_chunks:
+            check_cancelled()
+            yield chunk, function(chunk, *args)
+        return
+    futures = {executor().submit(function, chunk, *args): chunk
+               for chunk in item_chunks}
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            check_cancelled()
+            yield futures[future], future.result()
+    finally:
+        for future in futures:
+            future.cancel()
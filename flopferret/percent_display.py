@@ -13,56 +13,176 @@
 #
 # You should have received a copy of the GNU General Public License
 
-from PyQt5 import QtGui, QtWidgets
+"""A panel showing percentages as bars."""
 
+from PyQt5 import QtCore, QtGui, QtWidgets
 
-class PercentDisplayWidget(QtWidgets.QWidget):
-    """A simple percentage display widget with a bar and numerical label.
 
-    usage: wid = PercentDisplayWidget()
-           wid.setValue(0.8)
+class ResultsPanel(QtWidgets.QWidget):
+    """A panel of named percentages with bars, painted as one widget.
+
+    `columns` is a list of columns, each a list of (title, names) sections
+    laid out top to bottom. A section with a title of None has no heading.
+    `setValues` takes every value at once and repaints only the rows which
+    changed, in a single paint however many there are. With an
+    `animation_duration` (in milliseconds) the bars slide to their new
+    values; the animation only repaints, it never touches the layout.
+
+    usage: panel = ResultsPanel([[("Hands", ["Pair", "Flush"])]])
+           panel.setValues({"Pair": 0.8, "Flush": 0.1})
     """
 
-    def __init__(self, value=0.0, max_bar_width=250.0, color='#000000'):
-        super(PercentDisplayWidget, self).__init__()
-        self.value = value
+    row_spacing = 6
+    indent = 30
+    column_spacing = 12
+    text_spacing = 6
+
+    def __init__(self, columns, max_bar_width=100, color='#000000',
+                 animation_duration=0):
+        super(ResultsPanel, self).__init__()
         self.max_bar_width = max_bar_width
-        self.color = color
-        self.initUI()
-
-    def initUI(self):
-        layout = QtWidgets.QHBoxLayout()
-        layout.setContentsMargins(11, 0, 11, 0)
-        self.spacer = QtWidgets.QSpacerItem(0, 0)
-        self.label = QtWidgets.QLabel()
-        layout.addSpacerItem(self.spacer)
-        layout.addWidget(self.label)
-        self.setLayout(layout)
-        self.setFixedWidth(80 + self.max_bar_width)
-        self.setValue(self.value)
-
-    def setValue(self, value):
-        """Set the value to display (0 <= value <= 1)."""
-        # Float precision errors can lead to values greater than 1.
-        value = round(value, 4)
-        if value < 0 or value > 1:
-            raise ValueError('Only values between 0 and 1 are supported')
-        self.value = value
-        self.label.setText("{:.2f}%".format(self.value*100))
-        self.repaint()
+        self.color = QtGui.QColor(color)
+        self.columns = columns
+        self.names = [name for column in columns
+                      for (title, names) in column for name in names]
+        # The values shown, the values being moved towards, and where the
+        # current animation started from.
+        self.values = dict.fromkeys(self.names, 0.0)
+        self.targets = dict(self.values)
+        self.starts = dict(self.values)
+        self.tool_tips = {}
+        self.animation = QtCore.QVariantAnimation(self)
+        self.animation.setStartValue(0.0)
+        self.animation.setEndValue(1.0)
+        self.animation.setDuration(animation_duration)
+        self.animation.setEasingCurve(QtCore.QEasingCurve.OutCubic)
+        self.animation.valueChanged.connect(self.step)
+        self.layout_rows()
+
+    def layout_rows(self):
+        # Work out where each heading and row goes, and fix the size.
+        metrics = self.fontMetrics()
+        self.row_height = metrics.height() + self.row_spacing
+        bold = QtGui.QFont(self.font())
+        bold.setBold(True)
+        bold_metrics = QtGui.QFontMetrics(bold)
+        percent_width = metrics.width("100.00%") + self.text_spacing
+        self.headings = []
+        self.rows = {}
+        x = 0
+        height = 0
+        for column in self.columns:
+            label_width = max(
+                [metrics.width(name) + self.indent + self.text_spacing
+                 for (title, names) in column for name in names] +
+                [bold_metrics.width(title) - self.max_bar_width -
+                 percent_width for (title, names) in column if title]
+            )
+            y = 0
+            for title, names in column:
+                if title is not None:
+                    self.headings.append((title, QtCore.QRect(
+                        x, y, label_width + self.max_bar_width +
+                        percent_width, self.row_height)))
+                    y += self.row_height
+                for name in names:
+                    self.rows[name] = (
+                        QtCore.QRect(x + self.indent, y, label_width -
+                                     self.indent, self.row_height),
+                        QtCore.QRect(x + label_width, y, self.max_bar_width +
+                                     percent_width, self.row_height)
+                    )
+                    y += self.row_height
+            height = max(height, y)
+            x += label_width + self.max_bar_width + percent_width + \
+                self.column_spacing
+        self.setFixedSize(x - self.column_spacing, height)
+
+    def setValues(self, values):
+        """Set the values to display (0 <= value <= 1) from a dict with a
+        value for each name. Rows whose value is unchanged aren't
+        repainted."""
+        targets = {name: _check_value(values[name]) for name in self.names}
+        changed = [name for name in self.names
+                   if targets[name] != self.targets[name]]
+        if not changed:
+            return
+        self.targets = targets
+        if self.animation.duration() > 0:
+            self.animation.stop()
+            self.starts = dict(self.values)
+            self.animation.start()
+        else:
+            for name in changed:
+                self.values[name] = targets[name]
+                self.update(self.rows[name][1])
+
+    def step(self, progress):
+        # Move the bars part of the way to their targets.
+        for name in self.names:
+            start = self.starts[name]
+            value = start + (self.targets[name] - start)*progress
+            if value != self.values[name]:
+                self.values[name] = value
+                self.update(self.rows[name][1])
+
+    def setToolTips(self, tool_tips):
+        """Set the tool tips for each row from a dict by name. Rows which
+        aren't in the dict have none."""
+        self.tool_tips = dict(tool_tips)
+
+    def event(self, event):
+        if event.type() == QtCore.QEvent.ToolTip:
+            text = ""
+            for name, (label_rect, bar_rect) in self.rows.items():
+                if label_rect.united(bar_rect).contains(event.pos()):
+                    text = self.tool_tips.get(name, "")
+            if text:
+                QtWidgets.QToolTip.showText(event.globalPos(), text, self)
+            else:
+                QtWidgets.QToolTip.hideText()
+                event.ignore()
+            return True
+        return super(ResultsPanel, self).event(event)
 
     def paintEvent(self, event):
         qp = QtGui.QPainter()
         qp.begin(self)
-        self.drawWidget(qp)
+        self.drawWidget(qp, event.rect())
         qp.end()
 
-    def drawWidget(self, qp):
-        box_height = self.size().height()
-        bar_width = self.max_bar_width*self.value
-        self.spacer.changeSize(bar_width, 0)
-        color = QtGui.QColor(self.color)
-        qp.setPen(QtGui.QPen(color))
-        qp.setBrush(QtGui.QBrush(color))
-        qp.drawRect(0, int(round(box_height/4.0)), bar_width,
-                    int(round(box_height/2.0)))
+    def drawWidget(self, qp, region):
+        text_flags = QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter
+        text_pen = QtGui.QPen(self.palette().color(QtGui.QPalette.WindowText))
+        bold = QtGui.QFont(self.font())
+        bold.setBold(True)
+        qp.setFont(bold)
+        qp.setPen(text_pen)
+        for title, rect in self.headings:
+            if region.intersects(rect):
+                qp.drawText(rect, text_flags, title)
+        qp.setFont(self.font())
+        for name, (label_rect, bar_rect) in self.rows.items():
+            if region.intersects(label_rect):
+                qp.setPen(text_pen)
+                qp.drawText(label_rect, text_flags, name)
+            if not region.intersects(bar_rect):
+                continue
+            value = self.values[name]
+            bar_width = int(round(self.max_bar_width*value))
+            qp.setPen(QtGui.QPen(self.color))
+            qp.setBrush(QtGui.QBrush(self.color))
+            qp.drawRect(bar_rect.x(), bar_rect.y() + self.row_height//4,
+                        bar_width, self.row_height//2)
+            qp.setPen(text_pen)
+            qp.drawText(
+                bar_rect.adjusted(bar_width + self.text_spacing, 0, 0, 0),
+                text_flags, "{:.2f}%".format(100*value))
+
+
+def _check_value(value):
+    # Round away float errors, which can give values just over 1.
+    value = round(value, 4)
+    if value < 0 or value > 1:
+        raise ValueError('Only values between 0 and 1 are supported')
+    return value
@@ -0,0 +1,73 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""A debug panel showing the engine's profiling statistics."""
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from . import profiling
+
+
+class ProfilePanel(QtWidgets.QDialog):
+    """Shows stage timings and cache statistics while it is open.
+
+    Profiling is enabled while the panel is visible.
+    """
+
+    def __init__(self, parent=None):
+        super(ProfilePanel, self).__init__(parent)
+        self.was_enabled = profiling.enabled
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle("Profiling")
+        layout = QtWidgets.QVBoxLayout()
+        self.text = QtWidgets.QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(
+            QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont)
+        )
+        self.text.setMinimumSize(480, 280)
+        reset_button = QtWidgets.QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        layout.addWidget(self.text)
+        layout.addWidget(reset_button)
+        self.setLayout(layout)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.was_enabled = profiling.enabled
+        profiling.enable()
+        self.refresh()
+        self.timer.start()
+        super(ProfilePanel, self).showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        if not self.was_enabled:
+            profiling.disable()
+        super(ProfilePanel, self).hideEvent(event)
+
+    def reset(self):
+        profiling.reset()
+        self.refresh()
+
+    def refresh(self):
+        summary = profiling.summary()
+        if summary != self.text.toPlainText():
+            self.text.setPlainText(summary)
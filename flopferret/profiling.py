@@ -0,0 +1,141 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Optional per-stage timing of the analysis engine.
+
+Profiling is off unless the FLOPFERRET_PROFILE environment variable is set
+(in which case a summary is printed to stderr at exit) or `enable` is called.
+While it is off each stage costs one attribute lookup.
+
+Only work done in this process is recorded; calculations spread over the
+process pool are timed as a whole by their calling stage ("runout
+enumeration", "board enumeration" and "equity enumeration"). Stages can
+nest, so the times of different stages may overlap.
+
+usage: profiling.enable()
+       ... run some calculations ...
+       print(profiling.summary())
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+
+enabled = False
+
+_lock = threading.Lock()
+_stages = {}
+_caches = {}
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+class _Stage(object):
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            stats = _stages.setdefault(self.name, [0, 0.0])
+            stats[0] += self.calls
+            stats[1] += elapsed
+        return False
+
+
+def stage(name, calls=1):
+    """Return a context manager which records `calls` calls of stage `name`
+    and the time spent inside it."""
+    if not enabled:
+        return _null_stage
+    return _Stage(name, calls)
+
+
+def register_cache(name, function):
+    """Include the hits and misses of an lru_cache wrapped `function`."""
+    _caches[name] = function
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Forget the recorded stage times. Cache statistics are not reset."""
+    with _lock:
+        _stages.clear()
+
+
+def stats():
+    """Return a dict of stage and cache statistics."""
+    with _lock:
+        stages = {name: {"calls": calls, "seconds": seconds}
+                  for name, (calls, seconds) in _stages.items()}
+    caches = {}
+    for name, function in _caches.items():
+        info = function.cache_info()
+        caches[name] = {"hits": info.hits, "misses": info.misses,
+                        "size": info.currsize}
+    return {"stages": stages, "caches": caches}
+
+
+def summary():
+    """Return the statistics formatted as a table."""
+    data = stats()
+    lines = ["{:<24}{:>10}{:>12}{:>12}".format(
+        "Stage", "Calls", "Total ms", "Per call us")]
+    for name, stage_stats in sorted(data["stages"].items()):
+        calls, seconds = stage_stats["calls"], stage_stats["seconds"]
+        lines.append("{:<24}{:>10}{:>12.2f}{:>12.2f}".format(
+            name, calls, seconds*1e3, seconds*1e6/calls if calls else 0.0))
+    lines.append("")
+    lines.append("{:<24}{:>10}{:>12}{:>12}".format(
+        "Cache", "Hits", "Misses", "Size"))
+    for name, cache_stats in sorted(data["caches"].items()):
+        lines.append("{:<24}{:>10}{:>12}{:>12}".format(
+            name, cache_stats["hits"], cache_stats["misses"],
+            cache_stats["size"]))
+    return "\n".join(lines)
+
+
+def _print_summary():
+    print(summary(), file=sys.stderr)
+
+
+if os.environ.get("FLOPFERRET_PROFILE"):
+    enable()
+    atexit.register(_print_summary)
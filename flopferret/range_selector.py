@@ -18,7 +18,9 @@
 from PyQt5 import QtGui, QtCore, QtWidgets
 
 import eval7
+import numpy
 
+from . import hand_range
 from . import saved_ranges
 
 
@@ -26,7 +28,10 @@ class RangeSelector(QtWidgets.QDialog):
 
     def __init__(self, parent):
         super(RangeSelector, self).__init__(parent)
-        self.single_hands = [[], [], [], []]
+        # single_hands[i] is a mask of the combos entered as individual
+        # hands in weight slot i.
+        self.single_hands = numpy.zeros((4, len(hand_range.combos)),
+                                        dtype=bool)
         self.initUI()
 
     def initUI(self):
@@ -34,22 +39,30 @@ class RangeSelector(QtWidgets.QDialog):
         self.setModal(True)
 
         main_layout = QtWidgets.QVBoxLayout()
-        grid = self.layout_button_grid()
+        self.grid = RangeGrid()
+        self.grid.changed.connect(self.grid_changed)
         weight_selector = self.layout_weight_selector()
         h_box = QtWidgets.QHBoxLayout()
-        h_box.addLayout(grid)
+        h_box.addWidget(self.grid)
         v_box = QtWidgets.QVBoxLayout()
         v_box.addLayout(weight_selector)
+        self.folder_box = QtWidgets.QComboBox()
+        self.folder_box.setEditable(True)
+        folder_re = QtCore.QRegExp("^\w{0,12}$")
+        self.folder_box.setValidator(QtGui.QRegExpValidator(folder_re))
+        self.folder_box.lineEdit().setPlaceholderText("Folder")
         self.saved_ranges = QtWidgets.QComboBox()
         self.saved_ranges.setEditable(True)
         re = QtCore.QRegExp("^\w{1,12}$")
         self.saved_ranges.setValidator(QtGui.QRegExpValidator(re))
         self.load_data()
+        self.folder_box.activated.connect(self.load_folder)
         self.saved_ranges.currentIndexChanged.connect(self.load_range)
         save_button = QtWidgets.QPushButton("Save")
         save_button.clicked.connect(self.save_range)
         delete_button = QtWidgets.QPushButton("Delete")
         delete_button.clicked.connect(self.delete_range)
+        v_box.addWidget(self.folder_box)
         v_box.addWidget(self.saved_ranges)
         v_box.addWidget(save_button)
         v_box.addWidget(delete_button)
@@ -72,29 +85,6 @@ class RangeSelector(QtWidgets.QDialog):
         self.set_percent_label()
         self.show()
 
-    def layout_button_grid(self):
-        grid = QtWidgets.QGridLayout()
-        self.grid_buttons = {}
-        grid.setSpacing(0)
-        for x in range(13):
-            for y in range(13):
-                if x < y:
-                    suitedness = 's'
-                elif x > y:
-                    suitedness = 'o'
-                else:
-                    suitedness = ''
-                label = eval7.rangestring.ranks[12-min(x, y)] + \
-                    eval7.rangestring.ranks[12-max(x, y)] + suitedness
-                button = RangeSelectorButton(label, suitedness)
-                button.clicked.connect(
-                    # lambda token=label: self.handle_click(token)
-                    (lambda token: (lambda: self.handle_click(token)))(label)
-                )
-                self.grid_buttons[label] = button
-                grid.addWidget(button, x, y)
-        return grid
-
     def layout_weight_selector(self):
         layout = QtWidgets.QFormLayout()
         labels = ["Weight {}".format(i) for i in range(1, 5)]
@@ -122,73 +112,63 @@ class RangeSelector(QtWidgets.QDialog):
         return single_hand_layout
 
     def update_display(self):
-        i = self.weight_selector.currentIndex()
-        for token, button in self.grid_buttons.items():
-            button.setChecked(button.weights[i])
+        self.grid.setSlot(self.weight_selector.currentIndex())
         self.set_percent_label()
         self.set_single_hand_input()
-        self.repaint()
 
-    def handle_click(self, token):
-        modifiers = QtWidgets.QApplication.keyboardModifiers()
-        i = self.weight_selector.currentIndex()
-        tokens = [t for (t, w) in eval7.rangestring.string_to_tokens(token + '+')]
-        if modifiers == QtCore.Qt.ShiftModifier:
-            state = True
-        elif modifiers == QtCore.Qt.ControlModifier:
-            state = False
-        else:
-            state = not self.grid_buttons[token].weights[i]
-            tokens = [token]
-        for t in tokens:
-            button = self.grid_buttons[t]
-            button.weights[i] = state
+    def grid_changed(self):
         self.purge_duplicate_singles()
         self.set_percent_label()
-        self.update_display()
 
     def clear(self):
-        for button in self.grid_buttons.values():
-            button.weights = [False, False, False, False]
-        self.single_hands = [[], [], [], []]
+        self.grid.weights[:] = False
+        self.single_hands[:] = False
         for spinner in self.weight_spinners:
             spinner.setValue(100)
 
-    def load_data(self):
+    def load_data(self, folder="", name=""):
+        # Fill the folder and saved range lists, showing `name` in `folder`.
+        self.folder_box.blockSignals(True)
+        self.folder_box.clear()
+        self.folder_box.addItems(sorted(set(saved_ranges.folders()) | {""}))
+        self.folder_box.setCurrentText(folder)
+        self.folder_box.blockSignals(False)
+        self.load_folder()
+        self.saved_ranges.blockSignals(True)
+        self.saved_ranges.setCurrentIndex(
+            max(self.saved_ranges.findText(name), 0))
+        self.saved_ranges.blockSignals(False)
+
+    def load_folder(self):
+        # List the saved ranges in the current folder.
         data = saved_ranges.load()
-        for (name, range_str) in data.items():
-            self.saved_ranges.addItem(name, userData=range_str)
-        if len(data) == 0:
-            self.saved_ranges.addItem("", userData="")
+        names = saved_ranges.folders().get(self.folder_box.currentText(), [])
+        self.saved_ranges.blockSignals(True)
+        self.saved_ranges.clear()
+        self.saved_ranges.addItem("", userData="")
+        for name in names:
+            self.saved_ranges.addItem(name, userData=data[name])
+        self.saved_ranges.blockSignals(False)
 
     def save_range(self):
         name = self.saved_ranges.currentText()
         if name == "":
             # some sort of feedback maybe?
             return
-        range_str = self.range_string()
-        i = self.saved_ranges.findText(name)
-        if i > 0:
-            self.saved_ranges.setItemData(i, range_str)
-        else:
-            self.saved_ranges.addItem(name, userData=range_str)
-        self.write_ranges()
+        folder = self.folder_box.currentText()
+        saved_ranges.save(name, self.range_string(), folder)
+        self.load_data(folder, name)
 
     def load_range(self):
-        i = self.saved_ranges.currentIndex()
-        data = self.saved_ranges.itemData(i)
-        self.set_from_range_string(data)
-
-    def write_ranges(self):
-        data = {self.saved_ranges.itemText(i): self.saved_ranges.itemData(i)
-                for i in range(self.saved_ranges.count())}
-        return saved_ranges.dump(data)
+        data = self.saved_ranges.currentData()
+        if data:
+            self.set_from_range_string(data)
 
     def delete_range(self):
-        i = self.saved_ranges.currentIndex()
-        if not i == 0:
-            self.saved_ranges.removeItem(i)
-            self.write_ranges()
+        name = self.saved_ranges.currentText()
+        if name != "":
+            saved_ranges.delete(name)
+            self.load_data(self.folder_box.currentText())
 
     def check_input_state(self, *args, **kwargs):
         sender = self.sender()
@@ -197,8 +177,11 @@ class RangeSelector(QtWidgets.QDialog):
         if state[0] == QtGui.QValidator.Acceptable:
             color = '#b2ebf2'  # light blue
             i = self.weight_selector.currentIndex()
-            tokens = eval7.rangestring.string_to_tokens(state[1])
-            self.single_hands[i] = [t for (t, w) in tokens]
+            # The validator has already checked and normalized each hand.
+            hands = [h.strip() for h in state[1].split(',') if h.strip()]
+            self.single_hands[i] = False
+            self.single_hands[i, [hand_range.hand_index[h]
+                                  for h in hands]] = True
             self.purge_duplicate_singles()
             self.set_percent_label()
         elif state[0] == QtGui.QValidator.Intermediate:
@@ -207,17 +190,16 @@ class RangeSelector(QtWidgets.QDialog):
             color = '#f6989d'  # red
         sender.setStyleSheet('QLineEdit { background-color: %s }' % color)
 
+    def grid_combos(self):
+        """Return a (4, combos) mask of the combos selected on the grid in
+        each weight slot."""
+        return self.grid.weights[hand_range.combo_cells].T
+
     def purge_duplicate_singles(self):
-        for i in range(len(self.single_hands)):
-            for token, button in self.grid_buttons.items():
-                if button.weights[i]:
-                    hands = [''.join(x)
-                             for x in eval7.rangestring.token_to_hands(token)]
-                    self.single_hands[i] = [
-                        h for h in self.single_hands[i] if h not in hands
-                    ]
-            self.single_hands[i] = list(set(self.single_hands[i]))
-        self.set_single_hand_input()
+        duplicates = self.single_hands & self.grid_combos()
+        if duplicates.any():
+            self.single_hands &= ~duplicates
+            self.set_single_hand_input()
 
     def set_percent_label(self):
         combos = self.combos()
@@ -228,7 +210,8 @@ class RangeSelector(QtWidgets.QDialog):
 
     def set_single_hand_input(self):
         i = self.weight_selector.currentIndex()
-        token_list = [(t, 1.0) for t in self.single_hands[i]]
+        token_list = [(hand_range.hand_strings[j], 1.0)
+                      for j in numpy.flatnonzero(self.single_hands[i])]
         s = eval7.rangestring.tokens_to_string(token_list)
         self.single_hand_input.setText(s)
 
@@ -249,86 +232,144 @@ class RangeSelector(QtWidgets.QDialog):
                 continue
             i = weights.index(w)
             if len(t) == 4:
-                self.single_hands[i].append(t)
+                self.single_hands[i, hand_range.hand_index[t]] = True
             else:
-                self.grid_buttons[t].weights[i] = True
+                self.grid.weights[hand_range.cell_index[t], i] = True
         self.update_display()
 
     def combos(self, i=None):
-        combo_counts = {"": 6, "s": 4, "o": 12}
         i = i or self.weight_selector.currentIndex()
-        combos = 0
-        for button in self.grid_buttons.values():
-            if button.weights[i]:
-                combos += combo_counts[button.suitedness]
-        combos += len(self.single_hands[i])
-        return combos
+        return int((self.grid_combos()[i] | self.single_hands[i]).sum())
 
     def range_string(self):
         token_list = []
-        for token, button in self.grid_buttons.items():
-            for i, b in enumerate(button.weights):
-                if b:
-                    weight = self.weight_spinners[i].value()/100.0
-                    token_list.append((token, weight))
-        for i, tokens in enumerate(self.single_hands):
+        for cell, i in zip(*numpy.nonzero(self.grid.weights)):
+            weight = self.weight_spinners[i].value()/100.0
+            token_list.append((hand_range.grid_labels[cell], weight))
+        for i, j in zip(*numpy.nonzero(self.single_hands)):
             weight = self.weight_spinners[i].value()/100.0
-            token_list += [(token, weight) for token in tokens]
+            token_list.append((hand_range.hand_strings[j], weight))
         return eval7.rangestring.tokens_to_string(token_list)
 
 
-class RangeSelectorButton(QtWidgets.QPushButton):
+class RangeGrid(QtWidgets.QWidget):
+    """The 13x13 grid of hand classes, painted as one widget.
+
+    `weights` is a (169, 4) boolean array of which cells are selected in
+    each of the four weight slots, with cells in `hand_range.grid_labels`
+    order. Clicking a cell toggles it in the current slot, and dragging
+    paints the same state over every cell passed. Shift-click selects the
+    hand and every better hand of its kind ("AJs" selects "AJs+"), and
+    control-click deselects them. `changed` is emitted after each edit.
 
+    usage: grid = RangeGrid()
+           grid.changed.connect(update)
+           grid.setSlot(1)
+    """
+
+    changed = QtCore.pyqtSignal()
+
+    cell_size = 35
     _colors = {'s': "#98F098", 'o': "#FF9898", '': "#9898F0"}
     _selected_colors = {'s': "#D8FFD8", 'o': "#FFD8D8", '': "#D8D8FF"}
-    _weight_colors = (QtGui.QColor("#404040"), QtGui.QColor("#F06000"),
-                      QtGui.QColor("#800080"), QtGui.QColor("#0060D0"))
+    _weight_colors = ("#404040", "#F06000", "#800080", "#0060D0")
     _weight_pos = (4, 8, 25, 29)
-    _style = """
-    QPushButton {{
-        color: black;
-        font-weight: bold;
-        background-color: {};
-        border: 1px solid black;
-    }}
-    QPushButton:pressed {{
-        color: blue;
-        padding:0;
-    }}
-    QPushButton:checked {{
-        background-color: {};
-        font-weight: bold;
-        padding: 0;
-    }}"""
-
-    def __init__(self, label, suitedness):
-        super(RangeSelectorButton, self).__init__()
-
-        self.setText(label)
-        self.suitedness = suitedness
-        self.weights = [False, False, False, False]
-        self.initUI()
 
-    def initUI(self):
-        self.setStyle(QtWidgets.QStyleFactory.create("Cleanlooks"))
-        self.setFixedSize(35, 35)
-        self.setCheckable(True)
-        ss = self._style.format(
-            self._colors[self.suitedness],
-            self._selected_colors[self.suitedness]
-        )
-        self.setStyleSheet(ss)
+    def __init__(self):
+        super(RangeGrid, self).__init__()
+        self.weights = numpy.zeros((169, 4), dtype=bool)
+        self.slot = 0
+        self._paint_state = None
+        self._last_cell = None
+        self._fills = [
+            (QtGui.QColor(self._colors[label[2:]]),
+             QtGui.QColor(self._selected_colors[label[2:]]))
+            for label in hand_range.grid_labels
+        ]
+        self._weight_brushes = [QtGui.QColor(c) for c in self._weight_colors]
+        self.setFixedSize(13*self.cell_size, 13*self.cell_size)
+
+    def setSlot(self, slot):
+        """Show the selection for weight slot `slot`."""
+        self.slot = slot
+        self.update()
+
+    def cellAt(self, pos):
+        """Return the cell under the point `pos`, or None."""
+        column = pos.x() // self.cell_size
+        row = pos.y() // self.cell_size
+        if 0 <= row < 13 and 0 <= column < 13:
+            return 13*row + column
+        return None
+
+    def mousePressEvent(self, event):
+        cell = self.cellAt(event.pos())
+        if event.button() != QtCore.Qt.LeftButton or cell is None:
+            return
+        modifiers = event.modifiers()
+        if modifiers == QtCore.Qt.ShiftModifier:
+            self.set_cells(_better_cells(cell), True)
+        elif modifiers == QtCore.Qt.ControlModifier:
+            self.set_cells(_better_cells(cell), False)
+        else:
+            self._paint_state = not self.weights[cell, self.slot]
+            self._last_cell = cell
+            self.set_cells([cell], self._paint_state)
+
+    def mouseMoveEvent(self, event):
+        if self._paint_state is None:
+            return
+        cell = self.cellAt(event.pos())
+        if cell is not None and cell != self._last_cell:
+            self._last_cell = cell
+            self.set_cells([cell], self._paint_state)
+
+    def mouseReleaseEvent(self, event):
+        self._paint_state = None
+        self._last_cell = None
+
+    def set_cells(self, cells, state):
+        """Select or deselect `cells` in the current slot."""
+        if (self.weights[cells, self.slot] == state).all():
+            return
+        self.weights[cells, self.slot] = state
+        self.update()
+        self.changed.emit()
 
     def paintEvent(self, event):
-        super(RangeSelectorButton, self).paintEvent(event)
-        painter = QtGui.QPainter(self)
-        for (i, w) in enumerate(self.weights):
-            if w:
-                color = self._weight_colors[i]
-                pen = QtGui.QPen(color)
-                painter.setPen(pen)
-                painter.setBrush(QtGui.QColor(color))
-                painter.drawRoundedRect(4, self._weight_pos[i], 27, 2, 1, 1)
+        qp = QtGui.QPainter()
+        qp.begin(self)
+        self.drawWidget(qp, event.rect())
+        qp.end()
+
+    def drawWidget(self, qp, region):
+        size = self.cell_size
+        font = qp.font()
+        font.setBold(True)
+        qp.setFont(font)
+        border = QtGui.QPen(QtCore.Qt.black)
+        for cell, label in enumerate(hand_range.grid_labels):
+            row, column = divmod(cell, 13)
+            rect = QtCore.QRect(column*size, row*size, size, size)
+            if not region.intersects(rect):
+                continue
+            selected = self.weights[cell]
+            qp.setPen(border)
+            qp.setBrush(self._fills[cell][int(selected[self.slot])])
+            qp.drawRect(rect.adjusted(0, 0, -1, -1))
+            qp.drawText(rect, QtCore.Qt.AlignCenter, label)
+            qp.setPen(QtCore.Qt.NoPen)
+            for i in numpy.flatnonzero(selected):
+                qp.setBrush(self._weight_brushes[i])
+                qp.drawRoundedRect(
+                    rect.x() + 4, rect.y() + self._weight_pos[i], 27, 2, 1, 1)
+
+
+def _better_cells(cell):
+    # The cells of the hand in `cell` and the better hands of its kind.
+    token = hand_range.grid_labels[cell] + '+'
+    tokens = eval7.rangestring.string_to_tokens(token)
+    return [hand_range.cell_index[t] for (t, w) in tokens]
 
 
 class SingleHandListValidator(QtGui.QRegExpValidator):
@@ -13,12 +13,34 @@
 #
 # You should have received a copy of the GNU General Public License
 
-"""Simple interface to FlopFerret config file"""
+"""Simple interface to FlopFerret config file
 
+The saved ranges are kept in an in-memory index which is only rebuilt when
+the file changes on disk, so `load` is usually just a dict copy. Writes go
+to a temporary file which is renamed over the old one, and `save` and
+`delete` re-read the file first, so instances sharing the file don't undo
+each other's changes. Each range can be in a folder; names are still unique
+across folders, since #tags# refer to ranges by name alone.
+
+The compiled weights of each range are stored alongside it (in a .npz
+file), and only recompiled when the range or a range it uses changes.
+
+usage: save("open", "22+, AKs", folder="BTN")
+       load()      # {"open": "22+, AKs"}
+       folders()   # {"BTN": ["open"]}
+       compiled()  # {"open": <weights>}
+"""
+
+import hashlib
 import json
 import os
 import sys
 
+import eval7
+import numpy
+
+from . import hand_range
+
 if sys.platform.startswith('linux'):
     import xdg.BaseDirectory
     data_dir = xdg.BaseDirectory.xdg_data_home
@@ -31,21 +53,178 @@ else:
 
 config_dir = os.path.join(data_dir, "flopferret")
 config_filename = os.path.join(config_dir, "hand_ranges.json")
+weights_filename = os.path.join(config_dir, "hand_range_weights.npz")
 
+# The ranges by name, the folder of each range ("" for none), and the sorted
+# names in each folder, as of the file's `stamp`.
+_index = {"stamp": None, "ranges": {}, "folders": {}, "by_folder": {}}
+# Compiled weights by name, with the digest of what they were compiled from.
+_weights = {"stamp": None, "entries": {}}
 
-def load():
-    """Load data from FlopFerret config file."""
+
+def _stamp(path):
+    # Something which changes whenever the file at `path` is replaced.
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _refresh():
+    # Rebuild the index if the file has changed since it was read.
+    stamp = _stamp(config_filename)
+    if stamp is not None and stamp == _index["stamp"]:
+        return
     try:
         with open(config_filename, 'r') as f:
             data = json.load(f)
-        return data
-    except IOError:
-        return {}
+    except (IOError, ValueError):
+        data = {}
+    if "ranges" in data and isinstance(data["ranges"], dict):
+        ranges, folders = data["ranges"], data.get("folders", {})
+    else:
+        ranges, folders = data, {}  # The original flat format.
+    _set_index(stamp, ranges, folders)
+
+
+def _set_index(stamp, ranges, folders):
+    folders = {name: folders.get(name, "") for name in ranges}
+    by_folder = {}
+    for name in sorted(ranges):
+        by_folder.setdefault(folders[name], []).append(name)
+    _index.update(stamp=stamp, ranges=dict(ranges), folders=folders,
+                  by_folder=by_folder)
+
+
+def load():
+    """Load data from FlopFerret config file."""
+    _refresh()
+    return dict(_index["ranges"])
+
+
+def folders():
+    """Return the sorted names of the saved ranges in each folder. Ranges
+    which aren't in a folder are under ""."""
+    _refresh()
+    return {folder: list(names)
+            for folder, names in _index["by_folder"].items()}
+
 
+def dump(data, range_folders=None):
+    """Dump data to FlopFerret config file.
 
-def dump(data):
-    """Dump data to FlopFerret config file."""
-    if not os.path.exists(config_dir):
-        os.makedirs(config_dir)
-    with open(config_filename, "w+") as f:
-        json.dump(data, f)
+    Ranges keep their current folders unless `range_folders` gives them.
+    """
+    _refresh()
+    new_folders = dict(_index["folders"])
+    new_folders.update(range_folders or {})
+    _write(data, new_folders)
+
+
+def save(name, range_string, folder=None):
+    """Save a range under `name`, in `folder` if given (otherwise it stays
+    in the folder it was in)."""
+    _refresh()
+    ranges = dict(_index["ranges"])
+    ranges[name] = range_string
+    new_folders = dict(_index["folders"])
+    if folder is not None:
+        new_folders[name] = folder
+    _write(ranges, new_folders)
+
+
+def delete(name):
+    """Delete the saved range `name`, if there is one."""
+    _refresh()
+    ranges = dict(_index["ranges"])
+    if ranges.pop(name, None) is not None:
+        _write(ranges, _index["folders"])
+
+
+def _write(ranges, range_folders):
+    # Write the whole file under a temporary name and rename it into place,
+    # so it is never seen half written.
+    range_folders = {name: range_folders[name] for name in ranges
+                     if range_folders.get(name)}
+    data = {"ranges": ranges, "folders": range_folders}
+    _replace(config_filename, lambda f: f.write(json.dumps(data).encode()))
+    _set_index(_stamp(config_filename), ranges, range_folders)
+
+
+def _replace(path, write):
+    os.makedirs(config_dir, exist_ok=True)
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as f:
+        write(f)
+    os.replace(temporary, path)
+
+
+def compiled(data=None):
+    """Return the compiled weights of each valid range in the dict `data`
+    (the saved ranges by default).
+
+    Stored weights are used for ranges which haven't changed, and any
+    others are compiled and stored for next time.
+    """
+    if data is None:
+        data = load()
+    _load_weights()
+    entries = _weights["entries"]
+    result = {}
+    changed = False
+    for name, range_string in data.items():
+        try:
+            digest = _digest(range_string, data)
+            if entries.get(name, (None, ))[0] != digest:
+                weights = hand_range.compile_range(range_string, data)
+                entries[name] = (digest, weights)
+                changed = True
+        except eval7.rangestring.RangeStringError:
+            continue
+        result[name] = entries[name][1]
+    for name in set(entries) - set(data):
+        del entries[name]
+        changed = True
+    if changed:
+        _dump_weights()
+    return result
+
+
+def _digest(range_string, data):
+    # Identifies a range string along with the saved ranges it uses.
+    tags = hand_range.range_tags(range_string, data)
+    return hashlib.sha1(repr((range_string, tags)).encode()).hexdigest()
+
+
+def _load_weights():
+    stamp = _stamp(weights_filename)
+    if stamp is not None and stamp == _weights["stamp"]:
+        return
+    entries = {}
+    try:
+        with numpy.load(weights_filename) as f:
+            for name, digest, weights in zip(f["names"], f["digests"],
+                                             f["weights"]):
+                weights.setflags(write=False)
+                entries[str(name)] = (str(digest), weights)
+    except (IOError, ValueError, KeyError):
+        pass  # Missing or unreadable, so everything gets recompiled.
+    _weights.update(stamp=stamp, entries=entries)
+
+
+def _dump_weights():
+    names = sorted(_weights["entries"])
+    arrays = {
+        "names": numpy.array(names, dtype=str),
+        "digests": numpy.array([_weights["entries"][name][0]
+                                for name in names], dtype=str),
+        "weights": numpy.array([_weights["entries"][name][1]
+                                for name in names]).reshape(
+                                    len(names), len(hand_range.combos)),
+    }
+    try:
+        _replace(weights_filename, lambda f: numpy.savez(f, **arrays))
+    except OSError:
+        return  # Only a cache, so it can be rebuilt next time.
+    _weights["stamp"] = _stamp(weights_filename)
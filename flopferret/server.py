@@ -0,0 +1,352 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""A local server for the texture engine, for tools and notebooks.
+
+Requests are JSON over HTTP, on a localhost port or a Unix socket. Every
+client shares one process, so parsed ranges, classification tables and
+texture results are cached once for all of them. Identical requests which
+arrive while one is being evaluated share its result, and requests for the
+same board (or a suit isomorphic one) share one classification of it. The
+evaluations run on a pool of worker threads behind the asyncio front end.
+This module never imports Qt.
+
+usage: flopferret-cli serve --port 8765
+       curl -d '{"range": "22+, AKs", "board": "Ah Kd 7c"}' \
+           http://127.0.0.1:8765/texture
+
+    GET  /categories  the categories, and the sections they're shown in
+    GET  /status      request, evaluation and coalesced request counts
+    POST /texture     {"range", "board", "by_river"} -> {"result": {...}}
+    POST /range       {"ranges": [...], "op", "board"} -> {"range", "combos"}
+
+The /range operation is "union", "intersection" or "difference" (of the
+first range and the rest), with combos containing any "board" cards left
+out. Saved #tags# can be used in any range.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import ipaddress
+import json
+import logging
+import operator
+import os
+import signal
+import sys
+
+import eval7
+
+from . import board_texture
+from . import hand_range
+from . import isomorphism
+from . import parallel
+from . import saved_ranges
+from . import texture_db
+
+# Errors caused by bad requests rather than bugs.
+input_errors = (ValueError, KeyError, TypeError,
+                eval7.rangestring.RangeStringError)
+range_operations = {
+    "union": operator.or_,
+    "intersection": operator.and_,
+    "difference": operator.sub,
+}
+max_body_size = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large",
+            500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """Raised for a request which can't be handled, with its HTTP status."""
+
+    def __init__(self, status, message):
+        super(RequestError, self).__init__(message)
+        self.status = status
+
+
+def is_loopback(host):
+    """Return whether `host` is a loopback address."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class Server(object):
+    """Answers engine requests from any number of local clients.
+
+    usage: server = Server()
+           listener = await server.start(port=8765)
+    """
+
+    def __init__(self, workers=None):
+        self.workers = concurrent.futures.ThreadPoolExecutor(
+            workers or parallel.cpu_count())
+        # Futures for the evaluations in progress, by request key, and for
+        # the classifications in progress, by canonical board.
+        self.evaluations = {}
+        self.classifications = {}
+        self.counts = dict.fromkeys(
+            ["requests", "evaluations", "coalesced"], 0)
+        self.routes = {
+            ("GET", "/categories"): self.categories,
+            ("GET", "/status"): self.status,
+            ("POST", "/texture"): self.texture,
+            ("POST", "/range"): self.range_operation,
+        }
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """Start listening on `host` and `port`, or on the Unix socket
+        `path` if given. Return the asyncio server."""
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        if not is_loopback(host):
+            raise ValueError(
+                "Only serving on localhost, not '{}'".format(host))
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        """Stop the worker threads."""
+        self.workers.shutdown(wait=False)
+
+    def run(self, function, *args):
+        # Run `function(*args)` on a worker thread.
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.workers, function, *args)
+
+    async def coalesce(self, key, function, *args):
+        """Return the result of the coroutine (or future) `function(*args)`,
+        sharing it with any other request for the same `key` in progress."""
+        future = self.evaluations.get(key)
+        if future is None:
+            self.counts["evaluations"] += 1
+            future = asyncio.ensure_future(function(*args))
+            self.evaluations[key] = future
+            future.add_done_callback(
+                lambda f: self.evaluations.pop(key, None))
+        else:
+            self.counts["coalesced"] += 1
+        # A client going away mustn't cancel work others are waiting for.
+        return await asyncio.shield(future)
+
+    async def classify(self, board):
+        """Make sure the classification table for `board` is cached, with
+        one worker doing it for every request on the board at once."""
+        key = isomorphism.canonical_board(board)[0]
+        future = self.classifications.get(key)
+        if future is None:
+            future = self.run(board_texture.classification_table, board)
+            self.classifications[key] = future
+            future.add_done_callback(
+                lambda f: self.classifications.pop(key, None))
+        await asyncio.shield(future)
+
+    async def handle(self, reader, writer):
+        # Answer requests on one connection until the client is done.
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, writer)
+                except RequestError as e:
+                    _write_response(writer, e.status, {"error": str(e)},
+                                    False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, result = await self.respond(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                _write_response(writer, status, result, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # The client went away.
+        except Exception:
+            logger.exception("Error serving a connection")
+            _write_response(writer, 500, {"error": "Internal server error"},
+                            False)
+        finally:
+            writer.close()
+
+    async def respond(self, method, path, body):
+        """Return the HTTP status and JSON result for a request."""
+        self.counts["requests"] += 1
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(path == route_path for (m, route_path) in self.routes):
+                return 405, {"error": "Method not allowed"}
+            return 404, {"error": "No such endpoint: {}".format(path)}
+        try:
+            job = json.loads(body.decode()) if body else {}
+            if not isinstance(job, dict):
+                raise TypeError("Expected a JSON object")
+            return 200, await handler(job)
+        except input_errors as e:
+            return 400, {"error": "{}: {}".format(type(e).__name__, e)}
+        except Exception:
+            # A bug, so the client gets no details but the server log does.
+            logger.exception("Error handling %s %s", method, path)
+            return 500, {"error": "Internal server error"}
+
+    async def categories(self, job):
+        return {"categories": board_texture.categories,
+                "sections": board_texture.sections}
+
+    async def status(self, job):
+        return dict(self.counts)
+
+    async def texture(self, job):
+        """The texture of a range on a board."""
+        range_string = _string(job["range"])
+        board = list(map(eval7.Card,
+                         board_texture.parse_board(_string(job["board"]))))
+        by_river = bool(job.get("by_river", False))
+        saved = saved_ranges.load()
+        key = ("texture", range_string,
+               hand_range.range_tags(range_string, saved),
+               board_texture.board_key(board), by_river)
+        totals = await self.coalesce(
+            key, self._texture, range_string, saved, board, by_river)
+        return {"result": dict(zip(board_texture.categories, totals))}
+
+    async def _texture(self, range_string, saved, board, by_river):
+        weights = await self.compile(range_string, saved)
+        if not by_river:
+            totals = await self.run(texture_db.lookup, weights, board)
+            if totals is not None:
+                return totals.tolist()
+        if not by_river or len(board) == 5:
+            await self.classify(board)
+        totals = await self.run(
+            board_texture.texture_totals, weights, board, by_river)
+        return totals.tolist()
+
+    async def compile(self, range_string, saved):
+        """Return the weights of a range, parsing it on a worker."""
+        key = ("range", range_string,
+               hand_range.range_tags(range_string, saved))
+        return await self.coalesce(
+            key, self.run, hand_range.compile_range, range_string, saved)
+
+    async def range_operation(self, job):
+        """Combine ranges with a range operation."""
+        if not isinstance(job["ranges"], list):
+            raise TypeError(
+                "Expected a list of ranges, not {!r}".format(job["ranges"]))
+        range_strings = [_string(s) for s in job["ranges"]]
+        if not range_strings:
+            raise ValueError("No ranges given")
+        operation = job.get("op", "union")
+        if operation not in range_operations:
+            raise ValueError("Unknown operation '{}'".format(operation))
+        saved = saved_ranges.load()
+        weights = await asyncio.gather(
+            *[self.compile(s, saved) for s in range_strings])
+        result = functools.reduce(
+            range_operations[operation],
+            [hand_range.HandRange(weights=w) for w in weights])
+        dead = None
+        if job.get("board"):
+            board = list(map(eval7.Card,
+                             board_texture.parse_board(_string(job["board"]))))
+            dead = hand_range.card_mask(board)
+            result.weights[dead] = 0.0
+        return {"range": result.range_string(dead),
+                "combos": result.combo_count()}
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise TypeError("Expected a string, not {!r}".format(value))
+    return value
+
+
+async def _read_request(reader, writer):
+    # Return the (method, path, headers, body) of the next HTTP request, or
+    # None at the end of the connection.
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, path, version = line.decode("latin-1").split()
+    except ValueError:
+        raise RequestError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise RequestError(400, "Bad Content-Length")
+    if length > max_body_size:
+        raise RequestError(413, "Request body too large")
+    if length and headers.get("expect", "").lower() == "100-continue":
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?")[0], headers, body
+
+
+def _write_response(writer, status, result, keep_alive):
+    body = json.dumps(result).encode()
+    head = (
+        "HTTP/1.1 {} {}\r\n"
+        "Content-Type: application/json\r\n"
+        "Content-Length: {}\r\n"
+        "Connection: {}\r\n\r\n"
+    ).format(status, _reasons[status], len(body),
+             "keep-alive" if keep_alive else "close")
+    writer.write(head.encode() + body)
+
+
+def serve(host="127.0.0.1", port=8765, path=None, workers=None):
+    """Run a server on `host` and `port` (or the Unix socket `path`) until
+    interrupted or terminated."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    except NotImplementedError:
+        pass  # Not on Windows.
+    server = Server(workers)
+    listener = loop.run_until_complete(server.start(host, port, path))
+    print("Serving on {}".format(
+        path or "http://{}:{}".format(host, port)), file=sys.stderr)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        loop.run_until_complete(listener.wait_closed())
+        server.close()
+        loop.close()
+        if path is not None and os.path.exists(path):
+            os.remove(path)
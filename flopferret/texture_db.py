@@ -0,0 +1,151 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Precomputed flop textures for the saved ranges.
+
+The category totals of each saved range on every canonical flop are stored
+as a (flops x categories) .npy file in the data directory, with rows in
+the order of the flop keys in `flops.npy`. Files are named by a hash of the
+range's weights and the categories, so editing a saved range (or a range it
+uses) just needs a new file, and stale files are removed by the next
+`update`. Files are memory mapped, so a lookup only reads the one row it
+needs.
+
+Only suit symmetric ranges have a database, since other ranges don't have
+the same texture on suit isomorphic flops.
+
+usage: update(saved_ranges.load())     # In the background.
+       totals = lookup(weights, board)  # None if there's no database.
+"""
+
+import hashlib
+import os
+
+import numpy
+
+from . import atlas
+from . import board_texture
+from . import hand_range
+from . import isomorphism
+from . import saved_ranges
+
+database_dir = os.path.join(saved_ranges.config_dir, "textures")
+flops_filename = os.path.join(database_dir, "flops.npy")
+
+# Open databases by filename, or None for files which couldn't be read, so
+# a missing database only costs a dict lookup until `clear_caches`.
+_tables = {}
+# Multipliers packing a sorted flop key into one sortable number.
+_key_packing = numpy.array([52*52, 52, 1])
+
+
+def filename(weights):
+    """Return the database filename for the combo `weights`."""
+    digest = hashlib.sha1(numpy.asarray(weights, dtype=float).tobytes())
+    digest.update("\n".join(board_texture.categories).encode())
+    return os.path.join(database_dir, digest.hexdigest() + ".npy")
+
+
+def has_database(weights):
+    """Return whether the combo `weights` can have a database."""
+    weights = numpy.asarray(weights)
+    return bool(weights.any()) and isomorphism.is_suit_symmetric(weights)
+
+
+def build(weights, serial=False):
+    """Calculate the database for the combo `weights` and write it.
+
+    The file is written under a temporary name and renamed into place, so
+    it is never seen half written. Return the filename.
+    """
+    keys = [key for key, weight in atlas.flops()]
+    if not os.path.exists(flops_filename):
+        _write(flops_filename, numpy.array(keys, dtype=numpy.int8))
+    boards = [[hand_range.cards[i] for i in key] for key in keys]
+    path = filename(weights)
+    _write(path, board_texture.texture_over_boards(weights, boards, serial))
+    clear_caches()
+    return path
+
+
+def _write(path, array):
+    # Save `array` to `path`, replacing any old file in one step.
+    os.makedirs(database_dir, exist_ok=True)
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as f:
+        numpy.save(f, array)
+    os.replace(temporary, path)
+
+
+def update(saved, serial=False):
+    """Build any missing databases for the dict of `saved` ranges, and
+    remove databases no saved range uses any more. Return the names of the
+    ranges built."""
+    clear_caches()
+    built = []
+    wanted = {flops_filename}
+    for name, weights in sorted(saved_ranges.compiled(saved).items()):
+        if not has_database(weights):
+            continue
+        path = filename(weights)
+        wanted.add(path)
+        if not os.path.exists(path) or not os.path.exists(flops_filename):
+            build(weights, serial)
+            built.append(name)
+    if os.path.isdir(database_dir):
+        for entry in os.listdir(database_dir):
+            path = os.path.join(database_dir, entry)
+            if entry.endswith(".npy") and path not in wanted:
+                _tables.pop(path, None)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # In use elsewhere. The next update can remove it.
+    return built
+
+
+def clear_caches():
+    """Forget the open databases and the missing ones, to see databases
+    built by other processes."""
+    _tables.clear()
+
+
+def lookup(weights, board):
+    """Return the category totals for the combo `weights` on a flop from
+    the database, or None if there is no database for them."""
+    if len(board) != 3 or not has_database(weights):
+        return None
+    flops = _load(flops_filename)
+    table = _load(filename(weights))
+    if flops is None or table is None or \
+            table.shape != (len(flops), len(board_texture.categories)):
+        return None
+    key = isomorphism.canonical_board(board)[0]
+    row = numpy.searchsorted(flops, _key_packing.dot(key))
+    return numpy.array(table[row])
+
+
+def _load(path):
+    # Return the memory mapped array in `path`, or None if it can't be read.
+    # The flop keys are loaded packed, ready for searching.
+    if path not in _tables:
+        try:
+            array = numpy.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            array = None
+        if array is not None and path == flops_filename:
+            array = array.dot(_key_packing)
+        _tables[path] = array
+    return _tables[path]
@@ -0,0 +1,108 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Validators for the range and board inputs."""
+
+import functools
+
+from PyQt5 import QtCore, QtGui
+import eval7
+
+from . import hand_range
+
+
+class RangeValidator(QtGui.QValidator):
+    """Validator for range input."""
+
+    def validate(self, s, pos):
+        tags = set(s.split('#')[1::2])
+        tags = tuple(sorted((t, self.saved_ranges.get(t)) for t in tags))
+        new_s = _expand_range_string(s, tags)
+        if new_s is None:
+            # Accept any other input as intermediate.
+            return (QtGui.QValidator.Intermediate, s, pos)
+        if any(saved is not None for (tag, saved) in tags):
+            pos = len(new_s)
+        return (QtGui.QValidator.Acceptable, new_s, pos)
+
+
+@functools.lru_cache(maxsize=256)
+def _expand_range_string(s, tags):
+    # Replace tags in a range string with saved ranges and fix the case of
+    # tokens. Return None if the string can't be parsed.
+    if hand_range.range_tokens(s) is None:
+        return None
+    for tag, new_str in tags:
+        if new_str is not None:
+            s = s.replace("#{}#".format(tag), new_str)
+    in_tag = False
+    new_s = ""
+    for c in s:
+        if c == '#':
+            # A parseable string always has properly completed tags.
+            in_tag = not in_tag
+        if not in_tag and c in ''.join(eval7.rangestring.ranks).lower():
+            c = c.upper()
+        new_s += c
+    return new_s
+
+
+class BoardValidator(QtGui.QRegExpValidator):
+    """Validator for board input."""
+    _rank_str = ''.join(eval7.rangestring.ranks) + \
+                ''.join(eval7.rangestring.ranks).lower()
+    _suit_str = ''.join(eval7.rangestring.suits)
+    # A card is a rank and a suit.
+    _card_re_str = "[{}][{}]".format(_rank_str, _suit_str)
+    # A board is 3-5 cards, optionally with spaces between them.
+    _board_re = QtCore.QRegExp("({}( *)?){{3,5}}".format(_card_re_str))
+    # A partial card is a card, a rank, or a suit.
+    _partial_card_re_str = "(({})|[{}]|[{}])".format(
+        _card_re_str, _rank_str, _suit_str
+    )
+    # A sequence of partial cards is an intermediate match.
+    _partial_board_re = QtCore.QRegExp("({}( *)?){{0,5}}".format(
+        _partial_card_re_str))
+
+    def __init__(self):
+        super(BoardValidator, self).__init__(self._board_re)
+
+    def _get_card_strings(self, s):
+        stripped = s.replace(' ', '')
+        card_strings = [stripped[i:i+2].capitalize()
+                        for i in range(0, len(stripped) - 1, 2)]
+        if any(card_strings.count(x) > 1 for x in card_strings):
+            return None
+        else:
+            return card_strings
+
+    def validate(self, s, pos):
+        result, s, new_pos = super(BoardValidator, self).validate(s, pos)
+        if result == QtGui.QValidator.Invalid:
+            # Partial cards are intermediate.
+            if self._partial_board_re.exactMatch(s):
+                result = QtGui.QValidator.Intermediate
+                new_pos = pos
+        else:
+            card_strings = self._get_card_strings(s)
+            if card_strings is None:
+                # Duplicate cards are invalid.
+                result = QtGui.QValidator.Invalid
+            elif result == QtGui.QValidator.Acceptable:
+                # Reposition to account for the inserted spaces.
+                stripped_pos = len(s[:new_pos].replace(' ', ''))
+                new_pos = stripped_pos + (stripped_pos - 1)//2
+                s = ' '.join(card_strings)
+        return (result, s, new_pos)
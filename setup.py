@@ -26,11 +26,12 @@ setup(
     keywords='poker equity',
     packages=['flopferret'],
     entry_points={
-        'gui_scripts': ['flopferret=flopferret:main']
+        'gui_scripts': ['flopferret=flopferret:main'],
+        'console_scripts': ['flopferret-cli=flopferret.cli:main'],
     },
-    install_requires=['pyxdg', 'eval7>=0.1.6', 'PyQt5'],
+    install_requires=['pyxdg', 'eval7>=0.1.6', 'numpy', 'PyQt5'],
     options={'py2app': {
         'iconfile': 'macos/flopferret.icns',
-        'packages': 'PyQt5,eval7',
+        'packages': 'PyQt5,eval7,numpy',
     }},
 )
@@ -0,0 +1,38 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Check range strings survive a round trip through the combo weights."""
+
+import numpy
+
+from flopferret import hand_range
+
+
+def round_trip(range_string):
+    return hand_range.range_string(hand_range.compile_range(range_string))
+
+
+def test_fractional_weights():
+    assert round_trip("57%(AsKs)") == "57%(AsKs)"
+    assert round_trip("0.29(QJs)") == "29%(QJs)"
+    assert round_trip("AA, 0.333(AKo), 50%(KK)") == "AA, 50%(KK), 33%(AKo)"
+
+
+def test_every_percentage_is_stable():
+    for percent in range(1, 101):
+        string = round_trip("{}%(AKs, QQ, 7h6h)".format(percent))
+        weights = hand_range.compile_range(string)
+        assert round_trip(string) == string
+        assert numpy.allclose(weights[weights > 0], percent/100)
@@ -0,0 +1,64 @@
+# Copyright (C) 2014 Julian Andrews
+# This file is part of Flop Ferret.
+#
+# Flop Ferret is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Flop Ferret is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+"""Check the nut straight tables against brute force evaluation."""
+
+import itertools
+
+import eval7
+
+from flopferret import lookup_tables
+
+ranks = "23456789TJQKA"
+suits = "cdhs"
+
+
+def straight_value(ranks_):
+    # Evaluate a list of ranks with the suits cycled so there is never a
+    # flush, returning the value if it is a straight, else None.
+    cards = [eval7.Card(ranks[r] + suits[i % 4])
+             for i, r in enumerate(ranks_)]
+    value = eval7.evaluate(cards)
+    return value if eval7.handtype(value) == "Straight" else None
+
+
+def straight_with_high(high):
+    # The value of the straight with high rank `high`.
+    low = [12, 0, 1, 2, 3] if high == 3 else range(high - 4, high + 1)
+    return straight_value(list(low))
+
+
+def test_nut_straights():
+    for n in (3, 4, 5):
+        for board in itertools.combinations(range(13), n):
+            values = {straight_value(list(board) + [r1, r2])
+                      for r1 in range(13) for r2 in range(r1, 13)}
+            values = sorted(values - {None}, reverse=True) + [None, None]
+            mask = sum(1 << r for r in board)
+            nut = lookup_tables.nut_straights[mask]
+            second = lookup_tables.second_nut_straights[mask]
+            assert (nut == -1 and values[0] is None or
+                    straight_with_high(nut) == values[0]), board
+            assert (second == -1 and values[1] is None or
+                    straight_with_high(second) == values[1]), board
+
+
+def test_wheel_second_nuts():
+    # On 4 7 3 2 9 the seven high straight is the nuts and the wheel is
+    # second, even though no six high straight can be made.
+    mask = lookup_tables.rank_mask(
+        [eval7.Card(c) for c in ("4c", "7s", "3h", "2h", "9s")])
+    assert lookup_tables.nut_straights[mask] == 5
+    assert lookup_tables.second_nut_straights[mask] == 3